@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Per-op cost of executing defined words with the threaded inner interpreter,
+compared against dispatching each op through `VirtualMachine.handle_op`.
+"""
+
+import time
+import argparse
+
+from sloth.core import VirtualMachine
+from sloth.errors import WordExit
+
+
+PROGRAMS = {
+    'count': ': bench 0 begin 1+ dup {n} = until drop ;',
+    'arith': ': bench {n} begin 3 4 + 2 * drop 1- dup 0= until drop ;',
+    'shuffle': ': bench 1 2 {n} begin >r swap over drop r> 1- dup 0= until '
+               'drop 2drop ;',
+}
+
+
+def handle_op_call(word, vm):
+    """The inner interpreter before threaded code, kept for comparison."""
+    vm.frame_stack.push(word)
+    vm.enter()
+    while True:
+        try:
+            op = word.code[vm.ip]
+        except (IndexError, WordExit):
+            break
+        vm.handle_op(op)
+        vm.ip += 1
+    vm.exit()
+    vm.frame_stack.pop()
+
+
+def count_ops(word, vm):
+    """Count the ops executed by one call of a flat word."""
+    count = 0
+    vm.frame_stack.push(word)
+    vm.enter()
+    while vm.ip < len(word.code):
+        count += 1
+        vm.handle_op(word.code[vm.ip])
+        vm.ip += 1
+    vm.exit()
+    vm.frame_stack.pop()
+    return count
+
+
+def make_vm(source, n):
+    vm = VirtualMachine(source.format(n=n))
+    vm.import_module('std')
+    vm.run()
+    return vm
+
+
+def timed(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', type=int, default=100000,
+                        help='loop iterations per program')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    print(f'{"program":>10} {"ops":>10} {"handle_op":>12} {"threaded":>12} '
+          f'{"speedup":>8}')
+    for name, source in PROGRAMS.items():
+        vm = make_vm(source, args.n)
+        word = vm.dictionary['bench']
+        ops = count_ops(word, vm)
+        t_old = timed(lambda: handle_op_call(word, vm), args.repeat)
+        t_new = timed(lambda: word(vm), args.repeat)
+        ns_old = t_old / ops * 1e9
+        ns_new = t_new / ops * 1e9
+        print(f'{name:>10} {ops:>10} {ns_old:>9.1f} ns {ns_new:>9.1f} ns '
+              f'{ns_old / ns_new:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Startup time of fresh interpreters importing the Sloth modules, against a
+bare interpreter, and the optional or UI dependencies each import pulls in.
+"""
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+from pathlib import Path
+
+
+ROOT = Path(__file__).parent.parent
+
+STATEMENTS = {
+    'python': 'pass',
+    'sloth.core': 'import sloth.core',
+    'vm': "from sloth.core import VirtualMachine; VirtualMachine('3 4 +').run()",
+    'vm-std': ("from sloth.core import VirtualMachine; "
+               "vm = VirtualMachine('3 4 +'); vm.import_module('std'); vm.run()"),
+}
+
+# Modules the core virtual machine should not need
+UI_MODULES = ('termcolor', 'prompt_toolkit', 'pygments', 'configparser', 'numpy')
+
+
+# Time imports from cached bytecode, as in an installed package
+ENV = {k: v for k, v in os.environ.items() if k != 'PYTHONDONTWRITEBYTECODE'}
+
+
+def run_statement(statement):
+    subprocess.run([sys.executable, '-c', statement], cwd=ROOT, env=ENV,
+                   check=True)
+
+
+def startup_time(statement, repeat):
+    """Best wall time of a fresh interpreter running the statement."""
+    run_statement(statement)
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        run_statement(statement)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def loaded_modules(statement):
+    check = (f'{statement}\nimport sys\n'
+             f'print(" ".join(m for m in {UI_MODULES!r} if m in sys.modules))')
+    result = subprocess.run([sys.executable, '-c', check], cwd=ROOT, env=ENV,
+                            check=True, capture_output=True, text=True)
+    return result.stdout.split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+    base = startup_time(STATEMENTS['python'], args.repeat)
+    print(f'{"import":>12} {"best (ms)":>10} {"over python":>12}  loaded')
+    for name, statement in STATEMENTS.items():
+        best = startup_time(statement, args.repeat)
+        loaded = ' '.join(loaded_modules(statement)) or '-'
+        print(f'{name:>12} {best * 1e3:>10.1f} {(best - base) * 1e3:>12.1f}  '
+              f'{loaded}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Cost of the data stack operations used by the primitives, comparing the
+list-backed `Stack` against the previous deque-backed implementation.
+"""
+
+import time
+import operator
+import argparse
+from collections import deque
+
+from sloth.core import Stack
+from sloth.errors import VmRuntimeError
+
+
+class DequeStack(deque):
+    """The deque-backed stack before the list rewrite, kept for comparison."""
+    def push(self, v):
+        self.append(v)
+
+    @property
+    def top(self):
+        return self[-1]
+
+    @top.setter
+    def top(self, v):
+        self[-1] = v
+
+    def binary_op(self, func):
+        try:
+            v1 = self.pop()
+            v2 = self.pop()
+        except IndexError:
+            raise VmRuntimeError('Stack underflow')
+        self.push(func(v2, v1))
+
+
+def old_ops(s):
+    """Shufflers and arithmetic as written against the deque stack."""
+    s.push(s.top)
+    s.push(s[-2])
+    v1 = s.pop()
+    v2 = s.pop()
+    s.push(v1)
+    s.push(v2)
+    s.binary_op(operator.add)
+    s.top += 1
+    s.binary_op(operator.sub)
+
+
+def new_ops(s):
+    """The same sequence as written against the list stack."""
+    s.append(s[-1])
+    s.append(s[-2])
+    s[-1], s[-2] = s[-2], s[-1]
+    s.binary_op(operator.add)
+    s[-1] += 1
+    s.binary_op(operator.sub)
+
+
+def timed(func, stack, n, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        stack.clear()
+        stack.append(1)
+        t0 = time.perf_counter()
+        for _ in range(n):
+            func(stack)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', type=int, default=200000,
+                        help='repetitions of the op sequence')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    t_old = timed(old_ops, DequeStack(), args.n, args.repeat)
+    t_new = timed(new_ops, Stack(), args.n, args.repeat)
+    print(f'{"deque":>10} {t_old / args.n * 1e9:>9.1f} ns/seq')
+    print(f'{"list":>10} {t_new / args.n * 1e9:>9.1f} ns/seq')
+    print(f'{"speedup":>10} {t_old / t_new:>9.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Cost of tasks on one virtual machine, against OS threads doing the same:
+spawning and joining many short tasks, and passing items through a pipeline
+of stages connected by channels.
+"""
+
+import time
+import queue
+import argparse
+import threading
+
+from sloth.core import VirtualMachine
+
+
+SOURCE = '''
+: noop ( n -- n )  1+ ;
+: spawn-many ( n -- )  begin 1 1 ['] noop spawn join drop 1- 0= until drop ;
+: produce ( ch n -- )  begin 2dup swap send 1- 0= until 2drop ;
+: relay ( in out n -- )  begin >r over recv over send r> 1- 0= until drop 2drop ;
+: consume ( ch n -- sum )  0 >r begin over recv r> + >r 1- 0= until 2drop r> ;
+: pipeline ( n -- sum )
+  >r 16 channel 16 channel
+  over i 2 ['] produce spawn drop
+  2dup i 3 ['] relay spawn drop
+  swap drop r> 2 ['] consume spawn join ;
+'''
+
+
+def sloth_vm():
+    vm = VirtualMachine(SOURCE)
+    vm.import_module('std')
+    vm.run()
+    return vm
+
+
+def timed(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def sloth_spawn(vm, n):
+    word = vm.dictionary['spawn-many']
+    def run():
+        vm.stack.push(n)
+        word(vm)
+    return run
+
+
+def sloth_pipeline(vm, n):
+    word = vm.dictionary['pipeline']
+    def run():
+        vm.stack.push(n)
+        word(vm)
+        assert vm.stack.pop() == n * (n + 1) // 2
+    return run
+
+
+def thread_spawn(n):
+    def run():
+        for i in range(n):
+            thread = threading.Thread(target=lambda: i + 1)
+            thread.start()
+            thread.join()
+    return run
+
+
+def thread_pipeline(n):
+    def produce(out):
+        for i in range(n, 0, -1):
+            out.put(i)
+
+    def relay(inq, out):
+        for _ in range(n):
+            out.put(inq.get())
+
+    def run():
+        a, b = queue.Queue(16), queue.Queue(16)
+        threads = [threading.Thread(target=produce, args=(a,)),
+                   threading.Thread(target=relay, args=(a, b))]
+        for thread in threads:
+            thread.start()
+        total = sum(b.get() for _ in range(n))
+        for thread in threads:
+            thread.join()
+        assert total == n * (n + 1) // 2
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', type=int, default=10000,
+                        help='tasks spawned, and items through the pipeline')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    vm = sloth_vm()
+    rows = [
+        ('spawn tasks', sloth_spawn(vm, args.n)),
+        ('spawn threads', thread_spawn(args.n)),
+        ('pipeline tasks', sloth_pipeline(vm, args.n)),
+        ('pipeline threads', thread_pipeline(args.n)),
+    ]
+    for name, run in rows:
+        best = timed(run, args.repeat)
+        print(f'{name:>18} {best / args.n * 1e6:>9.2f} us/item')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Throughput of the `CharStream` tokenizer on large generated source files,
+and its speedup over the baseline tokenizer, which read a character at a
+time.
+"""
+
+import time
+import string
+import random
+import argparse
+from io import StringIO
+from pathlib import Path
+
+from sloth.core import CharStream
+
+
+STD_PATH = Path(__file__).parent.parent / Path('lib/std.sloth')
+
+
+def generate_source(size, seed=0):
+    """Generate roughly `size` characters of Sloth-like source text."""
+    rng = random.Random(seed)
+    words = ['dup', 'swap', 'over', 'rot', 'drop', '+', '-', '*', '1+',
+             'if', 'else', 'then', 'begin', 'until', '2dup', '>r', 'r>']
+    lines = []
+    length = 0
+    n = 0
+    while length < size:
+        body = ' '.join(
+            rng.choice(words) if rng.random() < 0.7 else str(rng.randint(0, 999))
+            for _ in range(rng.randint(4, 16))
+        )
+        line = f': word{n} ( a b -- c )  {body} ;'
+        lines.append(line)
+        length += len(line) + 1
+        n += 1
+    return '\n'.join(lines)
+
+
+class BaselineCharStream:
+    """The baseline tokenizer, reading the stream a character at a time."""
+    def __init__(self, stream):
+        self.stream = stream
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while True:
+            c = self.next_char()
+            if c not in string.whitespace:
+                self.last_word_start = self.stream.tell()
+                break
+        chars = [c]
+        while True:
+            try:
+                c = self.next_char()
+            except StopIteration:
+                break
+            if c in string.whitespace:
+                break
+            else:
+                chars.append(c)
+        return ''.join(chars)
+
+    def next_char(self):
+        char = self.stream.read(1)
+        if char == '':
+            raise StopIteration
+        return char
+
+
+def tokenize(text, chunk_size=None, baseline=False):
+    if baseline:
+        stream = BaselineCharStream(StringIO(text))
+    else:
+        stream = CharStream(StringIO(text), chunk_size=chunk_size)
+    count = 0
+    for _ in stream:
+        count += 1
+    return count
+
+
+def bench(text, repeat=3, chunk_size=None, baseline=False):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        count = tokenize(text, chunk_size=chunk_size, baseline=baseline)
+        best = min(best, time.perf_counter() - t0)
+    return count, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=float, nargs='+', default=[0.1, 1, 4],
+                        help='generated source sizes in MB')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--chunk-size', type=int, default=None)
+    args = parser.parse_args()
+    sources = [('std.sloth', STD_PATH.read_text())]
+    sources.extend(
+        (f'{size:g}MB', generate_source(int(size * 2**20)))
+        for size in args.sizes
+    )
+    print(f'{"source":>10} {"tokens":>10} {"time (s)":>10} '
+          f'{"MB/s":>8} {"Mtok/s":>8} {"base (s)":>10} {"speedup":>8}')
+    for name, text in sources:
+        count, elapsed = bench(text, repeat=args.repeat,
+                               chunk_size=args.chunk_size)
+        base_count, base_elapsed = bench(text, repeat=args.repeat,
+                                         baseline=True)
+        assert count == base_count, 'tokenizers disagree on the word count'
+        mbps = len(text) / 2**20 / elapsed
+        mtps = count / 1e6 / elapsed
+        print(f'{name:>10} {count:>10} {elapsed:>10.4f} '
+              f'{mbps:>8.2f} {mtps:>8.2f} {base_elapsed:>10.4f} '
+              f'{base_elapsed / elapsed:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
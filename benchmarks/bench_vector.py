@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Sum of squares computed by an interpreted loop, compared against the array
+words processing all elements in a single dispatch. Requires NumPy.
+"""
+
+import time
+import argparse
+
+from sloth.core import VirtualMachine
+from sloth.vector import numpy
+
+
+PROGRAMS = {
+    'loop': ': bench 0 {n} begin 1- dup dup * rot + swap dup 0= until '
+            'drop drop ;',
+    'vector': ': bench {n} iota dup * sum ;',
+}
+
+
+def timed(word, vm, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        word(vm)
+        best = min(best, time.perf_counter() - t0)
+        vm.stack.clear()
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    # Import NumPy outside of the timings
+    numpy()
+    print(f'{"n":>10} {"loop (s)":>10} {"vector (s)":>10} {"speedup":>8}')
+    for n in args.sizes:
+        times = {}
+        for name, source in PROGRAMS.items():
+            vm = VirtualMachine(source.format(n=n))
+            vm.import_module('std')
+            vm.run()
+            times[name] = timed(vm.dictionary['bench'], vm, args.repeat)
+        print(f'{n:>10} {times["loop"]:>10.4f} {times["vector"]:>10.4f} '
+              f'{times["loop"] / times["vector"]:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Run the benchmark suite, reporting the wall time and ops per second of each
+benchmark. Results can be written as JSON and compared against a baseline
+written by a previous run, failing if any benchmark got slower than the
+threshold allows.
+
+    python benchmarks/run.py --json baseline.json
+    python benchmarks/run.py --baseline baseline.json --threshold 0.1
+"""
+
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+from io import StringIO
+from pathlib import Path
+
+from sloth import __version__
+from sloth.core import VirtualMachine, CharStream, Output
+from sloth.modules import REGISTRY, find_module
+from sloth.profiler import Profiler
+
+from bench_import import STATEMENTS, run_statement
+from bench_tokenizer import generate_source
+
+
+PROGRAM_DIR = Path(__file__).parent / Path('programs')
+
+BENCHMARKS = {}
+
+
+def register(name):
+    """
+    Register a benchmark setup function, which returns a function running
+    the benchmark once and the number of ops it executes per run.
+    """
+    def decorator(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return decorator
+
+
+def count_tokens(text):
+    return sum(1 for _ in CharStream(StringIO(text)))
+
+
+def count_ops(vm, word):
+    """Number of words executed by one call of `word`, from a profiled run."""
+    profiler = vm.enable_profiler(Profiler())
+    word(vm)
+    vm.disable_profiler()
+    vm.stack.clear()
+    return sum(stats.calls for stats in profiler.stats.values())
+
+
+def program_benchmark(filen, jit):
+    """Benchmark calling `main` from a program in the programs directory."""
+    def setup():
+        vm = VirtualMachine((PROGRAM_DIR / Path(filen)).read_text())
+        vm.import_module('std')
+        vm.run()
+        main = vm.dictionary['main']
+        # Counted before JIT compilation, which runs a word as a single op
+        ops = count_ops(vm, main)
+        if jit:
+            vm.JIT_THRESHOLD = vm.DEFAULT_JIT_THRESHOLD
+        def run():
+            main(vm)
+            vm.stack.clear()
+        return run, ops
+    return setup
+
+
+for _filen in sorted(PROGRAM_DIR.glob('*.sloth')):
+    _name = _filen.stem.replace('_', '-')
+    register(_name)(program_benchmark(_filen.name, jit=False))
+    register(f'{_name}-jit')(program_benchmark(_filen.name, jit=True))
+
+
+@register('std-load')
+def std_load():
+    text = find_module('std').read_text()
+    def run():
+        REGISTRY.load('std', use_cache=False, reload=True)
+    return run, count_tokens(text)
+
+
+@register('tokenizer')
+def tokenizer():
+    text = generate_source(2**20)
+    def run():
+        for _ in CharStream(StringIO(text)):
+            pass
+    return run, count_tokens(text)
+
+
+@register('repl-line')
+def repl_line():
+    """Read and run short lines, as the REPL does for each prompt."""
+    lines = [
+        '3 4 + drop',
+        ': sq ( n -- n )  dup * ;',
+        '12 sq sq drop',
+        '1 2 3 rot -rot 2drop drop',
+        ': f ( n -- n )  dup 0> if 1- then ; 5 f drop',
+    ] * 40
+    vm = VirtualMachine('')
+    vm.WARN = False
+    vm.import_module('std')
+    def run():
+        for line in lines:
+            vm.read_input(line)
+            vm.run()
+    return run, len(lines)
+
+
+@register('output')
+def output():
+    """Write characters and numbers through the output buffer."""
+    vm = VirtualMachine(
+        ': main  1000 begin dup . 42 emit space 1- dup 0= until drop cr ;')
+    vm.import_module('std')
+    vm.run()
+    vm.output = Output(StringIO())
+    main = vm.dictionary['main']
+    ops = count_ops(vm, main)
+    def run():
+        main(vm)
+        vm.output.flush()
+        vm.output.sink = StringIO()
+    return run, ops
+
+
+@register('import')
+def import_core():
+    """Start an interpreter importing the core virtual machine."""
+    def run():
+        run_statement(STATEMENTS['sloth.core'])
+    return run, 1
+
+
+def measure(setup, warmup, repeat):
+    run, ops = setup()
+    for _ in range(warmup):
+        run()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - t0)
+    best = min(times)
+    return {
+        'ops': ops,
+        'best': best,
+        'median': statistics.median(times),
+        'times': times,
+        'ops_per_sec': ops / best,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print the change against the baseline and return the regressions."""
+    regressions = []
+    print(f'\n{"benchmark":>18} {"baseline (s)":>13} {"now (s)":>10} '
+          f'{"change":>8}')
+    for name, result in results.items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        change = result['best'] / base['best'] - 1
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f'{name:>18} {base["best"]:>13.4f} {result["best"]:>10.4f} '
+              f'{change:>+8.1%}{flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('names', nargs='*',
+                        help=f'benchmarks to run: {", ".join(BENCHMARKS)}')
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help='write the results to a JSON file')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='allowed slowdown against the baseline, as a '
+                             'fraction of its best time')
+    args = parser.parse_args()
+    names = args.names or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            parser.error(f'unknown benchmark: {name}')
+    print(f'{"benchmark":>18} {"ops":>10} {"best (s)":>10} {"median (s)":>11} '
+          f'{"ops/s":>12}')
+    results = {}
+    for name in names:
+        result = measure(BENCHMARKS[name], args.warmup, args.repeat)
+        results[name] = result
+        print(f'{name:>18} {result["ops"]:>10} {result["best"]:>10.4f} '
+              f'{result["median"]:>11.4f} {result["ops_per_sec"]:>12.0f}')
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'sloth': __version__,
+                'python': platform.python_version(),
+                'results': results,
+            }, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'\nSlower than the baseline: {", ".join(regressions)}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
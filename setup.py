@@ -32,9 +32,13 @@ setup(
         'pygments',
         'prompt_toolkit',
     ],
-    python_requires='>=3',
+    python_requires='>=3.8',
     extras_require={
         'test': ['pytest'],
+        'vector': ['numpy'],
+    },
+    entry_points={
+        'console_scripts': ['sloth = sloth.__main__:main'],
     },
     data_files=[
         ('lib', ['lib/std.sloth', 'lib/examples.sloth']),
@@ -1,23 +1,42 @@
-from pathlib import Path
-from configparser import ConfigParser
+__version__ = '0.1'
 
 
-system_path = [
-    Path('sloth.config').absolute(),
-    Path('~/.sloth.config'),
-    Path('~/.sloth/config'),
-    Path('~/.config/sloth/config'),
-    Path(__file__).parent/Path('default_config'),
-]
-system_path = [p.expanduser() for p in system_path]
+_config = None
 
-CONFIG = ConfigParser()
-for filen in system_path:
-    result = CONFIG.read(filen)
-    if result:
-        CONFIG.set('Paths', 'config_file', value=str(filen))
-        break
-else:
-    raise FileNotFoundError('Could not find configuration file.')
 
+def config_paths():
+    """Configuration files in the order they are searched."""
+    from pathlib import Path
+    return [
+        Path('sloth.config').absolute(),
+        Path('~/.sloth.config').expanduser(),
+        Path('~/.sloth/config').expanduser(),
+        Path('~/.config/sloth/config').expanduser(),
+        Path(__file__).parent/Path('default_config'),
+    ]
 
+
+def get_config():
+    """
+    Read the first configuration file found on the search path. The files
+    are only searched for the first time the configuration is needed.
+    """
+    global _config
+    if _config is None:
+        from configparser import ConfigParser
+        config = ConfigParser()
+        for filen in config_paths():
+            result = config.read(filen)
+            if result:
+                config.set('Paths', 'config_file', value=str(filen))
+                break
+        else:
+            raise FileNotFoundError('Could not find configuration file.')
+        _config = config
+    return _config
+
+
+def __getattr__(name):
+    if name == 'CONFIG':
+        return get_config()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Run Sloth programs from files, standard input or the command line.
+
+    sloth script.sloth           run a file
+    producer | sloth             run standard input as it arrives
+    sloth -e '3 4 + . cr'        run inline code
+    sloth --jobs 4 *.sloth       run files in parallel worker processes
+
+Without any program and with a terminal on standard input, start the REPL.
+"""
+
+import sys
+import argparse
+
+from .errors import VmRuntimeError
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='sloth', description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='*',
+                        help='source files to run in order, "-" for stdin')
+    parser.add_argument('-e', dest='exprs', action='append', default=[],
+                        metavar='SOURCE',
+                        help='run source text after the files, or in the '
+                             'order given with --jobs')
+    parser.add_argument('--no-std', action='store_true',
+                        help='do not import the standard library')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='run each program independently on this many '
+                             'worker processes')
+    return parser.parse_intermixed_args(argv)
+
+
+def run_serial(args):
+    """Run the programs in order on one virtual machine."""
+    from .core import VirtualMachine
+    vm = VirtualMachine('')
+    if not args.no_std:
+        vm.import_module('std')
+    files = args.files
+    if not files and not args.exprs:
+        files = ['-']
+    for filen in files:
+        if filen == '-':
+            vm.run_stream(sys.stdin, line_buffered=True)
+        else:
+            with open(filen) as f:
+                vm.run_stream(f)
+    for expr in args.exprs:
+        vm.run_stream(expr)
+
+
+def run_parallel(argv, args):
+    """Run each program independently, in the order given in `argv`."""
+    from .parallel import run_programs, programs_in_order, print_results
+    programs = programs_in_order(argv, args)
+    modules = () if args.no_std else ('std',)
+    return print_results(run_programs(programs, jobs=args.jobs,
+                                      modules=modules))
+
+
+def print_error(*args):
+    print('Error:', *args, file=sys.stderr)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    args = parse_args(argv)
+    if not args.files and not args.exprs and sys.stdin.isatty():
+        from .repl import repl
+        repl()
+        return 0
+    if args.jobs is not None:
+        return run_parallel(argv, args)
+    try:
+        run_serial(args)
+    except (VmRuntimeError, OSError) as err:
+        print_error(err)
+        return 1
+    except (RuntimeError, KeyError, IndexError, TypeError, ValueError,
+            ArithmeticError) as err:
+        print_error(f'{type(err).__name__}: {err}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Run a word over a batch of independent inputs. Words built only from
+elementwise primitives run once on NumPy columns holding the whole batch;
+any other word runs once per input on the same virtual machine.
+"""
+
+from .primitives import PRIMITIVES, BuiltinWord, DefinedWord, is_array
+
+
+# Builtins that apply elementwise when their operands are arrays, and move
+# items between the stacks without inspecting them.
+VECTORIZABLE = frozenset(PRIMITIVES[symbol] for symbol in (
+    '+', '-', '*', '/', '//', 'mod', 'neg', 'abs', '1+', '1-', 'max', 'min',
+    '=', '<>', '>', '<', '>=', '<=', '0=', '0<>', '0<', '0>', '1=', 'not',
+    'True', 'False', 'dup', 'drop', 'swap', 'over', 'rot', '-rot', '2swap',
+    '2over', '>r', 'r>', 'i', 'rdrop',
+    'sqrt', 'exp', 'log', 'sin', 'cos', 'tan', 'floor', 'ceil',
+))
+
+# Builtins whose NumPy results on booleans differ from Python's, which
+# treats them as integers, as True + True is True
+ARITHMETIC = frozenset(PRIMITIVES[symbol] for symbol in (
+    '+', '-', '*', '/', '//', 'mod', 'neg', 'abs', '1+', '1-', 'max', 'min',
+))
+
+
+def vectorizable(word, seen=None):
+    """
+    Whether a word only uses elementwise builtins, literals and other such
+    words. Branches cannot be vectorized, as they depend on a single flag.
+    """
+    if isinstance(word, BuiltinWord):
+        return word in VECTORIZABLE
+    if not isinstance(word, DefinedWord):
+        return False
+    # Words already checked, or being checked further up a recursion
+    seen = set() if seen is None else seen
+    if word in seen:
+        return True
+    seen.add(word)
+    code = word.code if word.source_code is None else word.source_code
+    for op in code:
+        if callable(op) and not vectorizable(op, seen):
+            return False
+    return True
+
+
+def builtins_used(word, used=None):
+    """The builtins a word calls, directly or through other defined words."""
+    used = set() if used is None else used
+    if isinstance(word, BuiltinWord):
+        used.add(word)
+    elif isinstance(word, DefinedWord) and word not in used:
+        used.add(word)
+        code = word.code if word.source_code is None else word.source_code
+        for op in code:
+            if callable(op):
+                builtins_used(op, used)
+    return used
+
+
+def as_tuples(inputs):
+    """Inputs as a list of tuples of items, from scalars, tuples or rows."""
+    if is_array(inputs):
+        inputs = inputs.tolist()
+    return [tuple(args) if isinstance(args, (tuple, list)) else (args,)
+            for args in inputs]
+
+
+def columns(np, inputs):
+    """
+    Transpose a batch of inputs into numeric column arrays, or None if a
+    column is not numeric or mixes integers with floats.
+    """
+    if isinstance(inputs, np.ndarray):
+        cols = list(inputs.reshape(len(inputs), -1).T)
+    else:
+        inputs = as_tuples(inputs)
+        if not inputs or len(set(map(len, inputs))) != 1:
+            return None
+        cols = []
+        for items in zip(*inputs):
+            col = np.asarray(items)
+            # Integers in a float column would come back as floats
+            if col.dtype.kind == 'f' and not all(
+                    isinstance(x, (float, np.floating)) for x in items):
+                return None
+            cols.append(col)
+    for col in cols:
+        if col.dtype.kind not in 'biuf':
+            return None
+    return cols
+
+
+def run_columns(np, vm, word, cols):
+    """Run a word on columns, returning its outputs broadcast to columns."""
+    vm.stack[:] = cols
+    # Raise where Python would, e.g. on division by zero, so that the
+    # per-item loop can report the error.
+    with np.errstate(all='raise'):
+        word(vm)
+    return [np.broadcast_to(out, cols[0].shape) for out in vm.stack]
+
+
+def overflowed(np, vm, word, cols, outputs):
+    """
+    Whether integer arithmetic may have wrapped around in the outputs of a
+    word, checked against a run of the word on float copies of the columns,
+    whose results only lose precision.
+    """
+    try:
+        expected = run_columns(np, vm, word, [col.astype(float) for col in cols])
+    except ArithmeticError:
+        return True
+    if len(expected) != len(outputs):
+        return True
+    return not all(np.allclose(out.astype(float), ref.astype(float),
+                               rtol=1e-9, atol=0, equal_nan=True)
+                   for out, ref in zip(outputs, expected))
+
+
+def run_vectorized(vm, word, inputs):
+    """
+    Run a word once on the columns of the inputs, returning the list of
+    output columns, or None if the batch cannot be vectorized.
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        return None
+    cols = columns(np, inputs)
+    if cols is None or not len(inputs):
+        return None
+    kinds = {col.dtype.kind for col in cols}
+    if 'b' in kinds and not ARITHMETIC.isdisjoint(builtins_used(word)):
+        return None
+    registers = (len(vm.frame_stack), len(vm.return_stack), vm.ip, vm.code)
+    try:
+        outputs = run_columns(np, vm, word, cols)
+        if kinds & set('iu') and overflowed(np, vm, word, cols, outputs):
+            return None
+        return outputs
+    except (ArithmeticError, TypeError, ValueError):
+        # Leave the machine as it was for the per-item loop
+        depth, rdepth, vm.ip, vm.code = registers
+        del vm.frame_stack[depth:]
+        del vm.return_stack[rdepth:]
+        return None
@@ -1,26 +1,42 @@
 #!/usr/bin/python3
 
-import os
 import re
+import sys
+import mmap
 import string
-import tokenize
+import struct
 from io import FileIO, StringIO
-from pathlib import Path
-from copy import deepcopy
+from itertools import islice
 from collections import deque
+from functools import lru_cache
 
-from . import CONFIG
-from .errors import VmRuntimeError
-from .primitives import PRIMITIVES
+from .batch import vectorizable, run_vectorized, as_tuples
+from .errors import (VmRuntimeError, StackUnderflow, StackOverflow,
+                     BudgetExceeded, index_error)
+from .jit import compile_word
+from .optimizer import optimize_word, dependencies, relink
+from .primitives import PRIMITIVES, DefinedWord, RETURN
 
 
 TABSTOP = 8
-NUMLIT_RE = re.compile('(-)?'+tokenize.Number)
+NUMLIT_CACHE_SIZE = 4096
 
 
-class Stack(deque):
-    push = deque.append
-    pushleft = deque.appendleft
+class Stack(list):
+    """
+    A stack held in a contiguous Python list, with the top at the end.
+
+    Primitives index and pop the list directly, without checking its depth.
+    An `IndexError` raised by popping or indexing past the bottom is turned
+    into a `StackUnderflow` once, by the interpreter loops, which tell it
+    from the errors of indexing other data by its message. Overflow is
+    checked against `limit` when frames are pushed and by `pushn`.
+    """
+    push = list.append
+
+    def __init__(self, iterable=(), limit=None):
+        super().__init__(iterable)
+        self.limit = sys.maxsize if limit is None else limit
 
     def __repr__(self):
         elem = ' '.join([str(x) for x in self])
@@ -34,101 +50,657 @@ class Stack(deque):
     def top(self, v):
         self[-1] = v
 
+    def pushleft(self, v):
+        self.insert(0, v)
+
+    def popn(self, n):
+        """Pop the top `n` items, returned in stack order."""
+        depth = len(self) - n
+        if depth < 0:
+            raise StackUnderflow('Stack underflow')
+        items = self[depth:]
+        del self[depth:]
+        return items
+
+    def pushn(self, items):
+        self.extend(items)
+        if len(self) > self.limit:
+            raise StackOverflow('Stack overflow')
+
     def unary_op(self, func):
-        try:
-            self.top = func(self.top)
-        except IndexError:
-            raise VmRuntimeError('Stack underflow')
+        self[-1] = func(self[-1])
 
     def binary_op(self, func):
+        v = self.pop()
+        self[-1] = func(self[-1], v)
+
+
+class JournaledDict(dict):
+    """
+    A dictionary that can record the previous value of every key changed
+    since its log was last reset, so those changes can be rolled back.
+    Observers are called as ``observer(key, added)`` whenever a key is
+    added or removed, including by a rollback.
+    """
+    MISSING = object()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.log = None
+        self.observers = []
+
+    def record(self, key):
+        if key not in self.log:
+            self.log[key] = self.get(key, self.MISSING)
+
+    def notify(self, key, added):
+        for observer in self.observers:
+            observer(key, added)
+
+    def __setitem__(self, key, value):
+        if self.log is not None:
+            self.record(key)
+        added = bool(self.observers) and key not in self
+        super().__setitem__(key, value)
+        if added:
+            self.notify(key, True)
+
+    def __delitem__(self, key):
+        if self.log is not None:
+            self.record(key)
+        super().__delitem__(key)
+        if self.observers:
+            self.notify(key, False)
+
+    def update(self, *args, **kwargs):
+        for k, v in dict(*args, **kwargs).items():
+            self[k] = v
+
+    def start_log(self):
+        self.log = {}
+
+    def rollback(self):
+        log, self.log = self.log, None
+        for key, value in log.items():
+            present = key in self
+            if value is self.MISSING:
+                super().pop(key, None)
+                if present and self.observers:
+                    self.notify(key, False)
+            else:
+                super().__setitem__(key, value)
+                if not present and self.observers:
+                    self.notify(key, True)
+        self.log = {}
+
+
+class LayeredDict(JournaledDict):
+    """
+    A journaled dictionary over a read-only base mapping, which is shared
+    rather than copied. Keys set here shadow those of the base, and only
+    these are journaled and rolled back.
+    """
+    def __init__(self, base):
+        super().__init__()
+        self.base = base
+
+    def __missing__(self, key):
+        return self.base[key]
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or key in self.base
+
+    def record(self, key):
+        if key not in self.log:
+            self.log[key] = dict.get(self, key, self.MISSING)
+
+    def get(self, key, default=None):
+        if dict.__contains__(self, key):
+            return dict.__getitem__(self, key)
+        return self.base.get(key, default)
+
+    def merged(self):
+        merged = dict(self.base)
+        merged.update(dict.items(self))
+        return merged
+
+    def __iter__(self):
+        return iter(self.merged())
+
+    def __len__(self):
+        return len(self.merged())
+
+    def keys(self):
+        return self.merged().keys()
+
+    def values(self):
+        return self.merged().values()
+
+    def items(self):
+        return self.merged().items()
+
+
+class Memory:
+    """
+    Contiguous data space of zero-initialized memory, addressed by byte.
+    Space is reserved with `allot` from the data pointer `here`, and holds
+    64 bit integer cells at aligned addresses, read and written through a
+    cell view of the same bytes.
+
+    Memory starts at address `BASE`, and memory mapped files are placed at
+    addresses above `MAP_BASE`, so the same words read and write them in
+    place. Integer addresses from `BASE` up refer to memory, and the words
+    accessing memory fall back to the dictionary heap for any other address.
+
+    Once `start_log` is called, the first previous value of every cell
+    written is logged, so that `rollback` can restore them. Writes to
+    mapped files are not logged.
+    """
+    CELL = 8
+    BASE = 2**32
+    MAP_BASE = 2**48
+    CELL_FORMAT = struct.Struct('q')
+
+    def __init__(self):
+        self.data = bytearray()
+        self.cells = memoryview(self.data).cast('q')
+        self.here = 0
+        self.mappings = {}
+        self.next_map = self.MAP_BASE
+        self.log = None
+
+    def __contains__(self, adr):
+        return type(adr) is int and adr >= self.BASE
+
+    @property
+    def dp(self):
+        """Address of the data pointer."""
+        return self.BASE + self.here
+
+    def start_log(self):
+        self.log = {}
+
+    def rollback(self):
+        """Restore the cells written since the log was started."""
+        cells = self.cells
+        for index, value in self.log.items():
+            cells[index] = value
+        self.log.clear()
+
+    def log_range(self, offset, n):
+        """Log the cells holding the `n` bytes at `offset` before a write."""
+        log = self.log
+        cells = self.cells
+        for index in range(offset // self.CELL, -(-(offset + n) // self.CELL)):
+            if index not in log:
+                log[index] = cells[index]
+
+    def allot(self, n):
+        """Move the data pointer by `n` bytes, growing the buffer as needed."""
+        here = self.here + n
+        if here < 0:
+            raise VmRuntimeError('Cannot free memory below its base address')
+        if here > len(self.data):
+            # Grow geometrically, in whole cells. The buffer cannot be
+            # resized while the cell view is exported.
+            size = max(here, 2 * len(self.data))
+            size += -size % self.CELL
+            self.cells.release()
+            self.data.extend(bytes(size - len(self.data)))
+            self.cells = memoryview(self.data).cast('q')
+        self.here = here
+
+    def align(self):
+        self.allot(-self.here % self.CELL)
+
+    def map(self, buffer):
+        """Place a buffer, such as an `mmap`, in memory and return its address."""
+        adr = self.next_map
+        self.mappings[adr] = buffer
+        # Leave a gap of a page so that ranges cannot run into the next map
+        size = len(buffer) + mmap.PAGESIZE
+        self.next_map += size + -size % mmap.PAGESIZE
+        return adr
+
+    def unmap(self, adr):
         try:
-            v1 = self.pop()
-            v2 = self.pop()
-            self.push(func(v2, v1))
-        except IndexError:
-            raise VmRuntimeError('Stack underflow')
+            return self.mappings.pop(adr)
+        except KeyError:
+            raise VmRuntimeError(f'No mapping at address "{adr}"')
+
+    def mapping_at(self, adr):
+        for base, buffer in self.mappings.items():
+            if base <= adr < base + len(buffer):
+                return base
+        return None
+
+    def locate(self, adr, n, write=False):
+        """
+        The buffer holding the `n` bytes at `adr`, and their offset in it,
+        logging their cells first if they are about to be written.
+        """
+        if type(adr) is int and n >= 0:
+            offset = adr - self.BASE
+            if 0 <= offset and offset + n <= self.here:
+                if write and self.log is not None:
+                    self.log_range(offset, n)
+                return self.data, offset
+            base = self.mapping_at(adr)
+            if base is not None:
+                buffer = self.mappings[base]
+                if adr + n <= base + len(buffer):
+                    return buffer, adr - base
+        raise VmRuntimeError(f'Range of {n} bytes at "{adr}" is outside of memory')
+
+    def fetch(self, adr):
+        offset = adr - self.BASE
+        if offset + self.CELL <= self.here:
+            if offset % self.CELL:
+                raise VmRuntimeError(f'Address "{adr}" is not cell aligned')
+            return self.cells[offset // self.CELL]
+        buffer, offset = self.locate(adr, self.CELL)
+        return self.CELL_FORMAT.unpack_from(buffer, offset)[0]
+
+    def store(self, adr, value):
+        offset = adr - self.BASE
+        try:
+            if offset + self.CELL <= self.here:
+                if offset % self.CELL:
+                    raise VmRuntimeError(f'Address "{adr}" is not cell aligned')
+                index = offset // self.CELL
+                log = self.log
+                if log is not None and index not in log:
+                    log[index] = self.cells[index]
+                self.cells[index] = value
+            else:
+                buffer, offset = self.locate(adr, self.CELL)
+                self.CELL_FORMAT.pack_into(buffer, offset, value)
+        except (TypeError, ValueError, struct.error):
+            raise VmRuntimeError(f'Cannot store "{value}" in a memory cell')
+
+
+class Journal:
+    """
+    Undo log of the changes made to a virtual machine since the last
+    checkpoint. Dictionary inserts and heap writes are logged as they happen
+    by their `JournaledDict`, so rolling back takes time proportional to the
+    number of keys changed rather than to the size of the session. The
+    stacks, VM registers and the code of the last defined word, with its
+    unoptimized code, are saved shallowly at each checkpoint. Writes to linear memory are logged by
+    `Memory` like those to a dictionary, and its allocation is rolled back.
+    """
+    def __init__(self, vm):
+        self.vm = vm
+        self.saved = None
+
+    def checkpoint(self):
+        vm = self.vm
+        vm.dictionary.start_log()
+        vm.heap.start_log()
+        vm.memory.start_log()
+        last = vm.last_word
+        self.saved = {
+            'stack': list(vm.stack),
+            'return_stack': list(vm.return_stack),
+            'frame_stack': list(vm.frame_stack),
+            'ip': vm.ip,
+            'here': vm.memory.here,
+            'immediate': vm.immediate,
+            'last_word': last,
+            'last_code': None if last is None else list(last.code),
+            'last_source': None if last is None else last.source_code,
+            'last_flags': None if last is None else (last.immediate, last.hidden),
+        }
+
+    def rollback(self):
+        if self.saved is None:
+            raise VmRuntimeError('No checkpoint to revert to')
+        vm = self.vm
+        saved = self.saved
+        vm.dictionary.rollback()
+        vm.heap.rollback()
+        vm.memory.rollback()
+        for name in ('stack', 'return_stack', 'frame_stack'):
+            stack = getattr(vm, name)
+            stack.clear()
+            stack.extend(saved[name])
+        vm.ip = saved['ip']
+        vm.memory.here = saved['here']
+        vm.immediate = saved['immediate']
+        last = vm.last_word = saved['last_word']
+        if last is not None:
+            last.code[:] = saved['last_code']
+            last.invalidate()
+            last.source_code = saved['last_source']
+            last.immediate, last.hidden = saved['last_flags']
 
 
 class CharStream:
     """
     A stream that provides iteration over whitespace separated words, as well
     as invdividual characters.
+
+    Text is read from the underlying stream in chunks of ``chunk_size``
+    characters, and all the words of a chunk are split out at once into a
+    queue, which iteration pops from. A word running to the end of the chunk
+    may continue into the next, so it is left in the buffer until then.
+    Consumed text is discarded when the buffer is refilled, so arbitrarily
+    long streams are tokenized in constant memory.
+
+    The position in the buffer is only found again when it is needed, by
+    `next_char`, `read_until` and `last_word_start`, by matching the words
+    taken from the queue since it was last known with a compiled regular
+    expression.
+
+    With ``line_buffered``, chunks are read a line at a time (still at most
+    ``chunk_size`` characters), so that the words of interactive or piped
+    input are available as soon as their line arrives.
     """
-    def __init__(self, stream):
+    CHUNK_SIZE = 64 * 1024
+    WHITESPACE = string.whitespace
+    WORD_RE = re.compile('([^{0}]+)[{0}]?'.format(re.escape(WHITESPACE)))
+    # Characters `str.split` also splits words on
+    OTHER_SPACE_RE = re.compile(
+        '[\x1c-\x1f\x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f'
+        '\u205f\u3000]')
+
+    def __init__(self, stream, chunk_size=None, line_buffered=False):
         if isinstance(stream, str):
             self.stream = StringIO(stream)
         else:
             self.stream = stream
-        self.last_word_start = None
+        self.chunk_size = self.CHUNK_SIZE if chunk_size is None else chunk_size
+        self.read = self.stream.readline if line_buffered else self.stream.read
+        self.buffer = ''
+        # Position of the text not yet consumed, when no word has been taken
+        # from the queue since it was set
+        self.pos = 0
+        self.offset = 0
+        self.eof = False
+        self.words = deque()
+        # Size of the queue when `pos` was set
+        self.queued = 0
+        # Start of the last queued word and the position following it
+        self.queue_end = (0, 0)
+        self.word_start = None
 
     def __iter__(self):
         return self
 
     def __next__(self):
+        try:
+            return self.words.popleft()
+        except IndexError:
+            return self.next_chunk()
+
+    def next_chunk(self):
+        """Queue the words of the buffer, filling it as needed."""
+        if self.queued:
+            # All the queued words were consumed
+            start, self.pos = self.queue_end
+            self.word_start = self.offset + start
+            self.queued = 0
         while True:
-            # Skip initial whitespace before the word
-            c = self.next_char()
-            if c not in string.whitespace:
-                self.last_word_start = self.stream.tell()
-                break
-        chars = [c]
-        while True:
-            # Return if the stream ends with the word end
-            try:
-                c = self.next_char()
-            except StopIteration:
-                break
-            # Accumulate until a whitespace character
-            if c in string.whitespace:
-                break
+            buffer = self.buffer
+            if self.OTHER_SPACE_RE.search(buffer, self.pos) is None:
+                words = buffer[self.pos:].split()
             else:
-                chars.append(c)
-        return ''.join(chars)
+                words = self.WORD_RE.findall(buffer, self.pos)
+            cut = len(buffer)
+            if words and not self.eof and buffer[-1] not in self.WHITESPACE:
+                # The last word may continue into the next chunk
+                cut -= len(words.pop())
+            if words:
+                # Only whitespace follows the last word before the cut, and
+                # the word is consumed with the single whitespace character
+                # delimiting it
+                start = buffer.rfind(words[-1], 0, cut)
+                end = start + len(words[-1])
+                self.queue_end = (start, min(end + 1, len(buffer)))
+                self.words.extend(words)
+                self.queued = len(self.words)
+                return self.__next__()
+            self.pos = cut
+            if not self.fill() and cut == len(buffer):
+                raise StopIteration
+
+    def sync(self):
+        """Set `pos` after the words taken from the queue."""
+        taken = self.queued - len(self.words)
+        if not taken:
+            return
+        if self.words:
+            matches = self.WORD_RE.finditer(self.buffer, self.pos)
+            match = next(islice(matches, taken - 1, None))
+            self.word_start = self.offset + match.start()
+            self.pos = match.end()
+        else:
+            start, self.pos = self.queue_end
+            self.word_start = self.offset + start
+        self.queued = len(self.words)
+
+    def advance(self, pos):
+        """
+        Consume the text up to `pos`, dropping the queued words it covers.
+        A word it ends within is cut down to the text following `pos`.
+        """
+        self.sync()
+        words = self.words
+        if words and pos > self.pos:
+            matches = self.WORD_RE.finditer(self.buffer, self.pos)
+            for match in matches:
+                if match.start() >= pos:
+                    break
+                words.popleft()
+                if match.end(1) > pos:
+                    if not words:
+                        self.queue_end = (pos, self.queue_end[1])
+                    words.appendleft(self.buffer[pos:match.end(1)])
+                    break
+                if not words:
+                    break
+        self.pos = pos
+        self.queued = len(words)
+
+    @property
+    def last_word_start(self):
+        """Offset in the stream of the start of the last word."""
+        self.sync()
+        return self.word_start
+
+    def fill(self):
+        """
+        Read the next chunk from the stream into the buffer, discarding the
+        consumed text and the queued words. Returns False if the stream is
+        exhausted.
+        """
+        if self.eof:
+            return False
+        chunk = self.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.offset += self.pos
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        self.words.clear()
+        self.queued = 0
+        return True
 
     def next_char(self):
-        char = self.stream.read(1)
-        if char == '':
+        self.sync()
+        if self.pos >= len(self.buffer) and not self.fill():
             raise StopIteration
+        char = self.buffer[self.pos]
+        self.advance(self.pos + 1)
         return char
 
+    def read_until(self, sentinel):
+        """
+        Consume and return the text up to the next occurrence of
+        ``sentinel``, which is itself consumed. Returns the remaining text if
+        the stream ends first.
+        """
+        self.sync()
+        start = self.pos
+        while True:
+            ix = self.buffer.find(sentinel, start)
+            if ix >= 0:
+                text = self.buffer[self.pos:ix]
+                self.advance(ix + len(sentinel))
+                return text
+            # Keep a partial match at the end of the buffer searchable
+            start = max(0, len(self.buffer) - self.pos - len(sentinel) + 1)
+            if not self.fill():
+                text = self.buffer[self.pos:]
+                self.advance(len(self.buffer))
+                return text
+
+    def discard(self):
+        """Drop any buffered input that has not yet been consumed."""
+        self.sync()
+        self.offset += self.pos
+        self.buffer = ''
+        self.pos = 0
+        self.words.clear()
+        self.queued = 0
+
     def write(self, text):
-        pos = self.stream.tell()
-        self.stream.write('\n')
-        self.stream.write(text)
-        self.stream.seek(pos)
+        """
+        Inject text into the stream, to be read before any input that has
+        not yet been consumed.
+        """
+        self.sync()
+        self.offset += self.pos
+        self.buffer = '\n' + text + self.buffer[self.pos:]
+        self.pos = 0
+        self.eof = False
+        self.words.clear()
+        self.queued = 0
+
+
+class Output:
+    """
+    Buffered text output of a virtual machine. Text is collected until at
+    least ``size`` characters are pending and then written to ``sink`` in a
+    single call. The sink is any text stream, such as a file or a
+    ``StringIO`` capturing the output of an embedded machine; by default it
+    is whichever ``sys.stdout`` is current when the buffer is flushed. Output
+    to a terminal, marked by ``tty``, is also flushed at the end of every
+    line.
+    """
+    BUFFER_SIZE = 8192
+
+    def __init__(self, sink=None, size=None):
+        self.sink = sink
+        self.size = self.BUFFER_SIZE if size is None else size
+        self.parts = []
+        self.pending = 0
+        stream = sys.stdout if sink is None else sink
+        self.tty = hasattr(stream, 'isatty') and stream.isatty()
+
+    def write(self, text):
+        self.parts.append(text)
+        self.pending += len(text)
+        if self.pending >= self.size or self.tty and '\n' in text:
+            self.flush()
+
+    def print(self, *args, sep=' ', end='\n'):
+        self.write(sep.join([str(arg) for arg in args]) + end)
+
+    def flush(self):
+        if not self.parts:
+            return
+        sink = sys.stdout if self.sink is None else self.sink
+        sink.write(''.join(self.parts))
+        sink.flush()
+        self.parts.clear()
+        self.pending = 0
 
 
+@lru_cache(maxsize=NUMLIT_CACHE_SIZE)
 def convert_numeric_literal(name):
-    if NUMLIT_RE.fullmatch(name):
-        return eval(name)
-    else:
+    """
+    Convert a Python numeric literal with an optional leading minus sign,
+    e.g. "-1_000", "0x1F", "2.5e-3" or "3j", into its value.
+    """
+    text = name[1:] if name.startswith('-') else name
+    if not text or text[0] not in '0123456789.':
         raise ValueError('Invalid numeric literal')
+    if text[:2] in ('0x', '0X', '0o', '0O', '0b', '0B'):
+        value = int(text, 0)
+    elif text[-1] in 'jJ':
+        value = complex(0, float(text[:-1]))
+    elif '.' in text or 'e' in text or 'E' in text:
+        value = float(text)
+    else:
+        # Base zero follows the literal grammar, e.g. rejecting "01"
+        value = int(text, 0)
+    return -value if text is not name else value
 
 
 def is_numeric_literal(name):
-    return bool(NUMLIT_RE.fullmatch(name))
+    try:
+        convert_numeric_literal(name)
+        return True
+    except ValueError:
+        return False
+
+
+class Preempted(Exception):
+    """Raised out of `VirtualMachine.run_sliced` when a slice is used up."""
 
 
 class VirtualMachine:
     WARN = True
-
-    def __init__(self, stream):
+    # Color warnings written to a terminal, as set by the interactive REPL
+    COLOR = False
+    USE_CACHE = True
+    OPTIMIZE = True
+    LATE_BIND = False
+    STACK_LIMIT = 2**24
+    OUTPUT_BUFFER_SIZE = Output.BUFFER_SIZE
+    DEFAULT_JIT_THRESHOLD = 100
+    JIT_THRESHOLD = None
+
+    def __init__(self, stream, base=None):
         self.stream = CharStream(stream)
         self.ip = 0
-        self.stack = Stack()
-        self.return_stack = Stack()
+        self.code = None
+        self.stack = Stack(limit=self.STACK_LIMIT)
+        self.return_stack = Stack(limit=self.STACK_LIMIT)
         self.frame_stack = Stack()
-        self.dictionary = PRIMITIVES.copy()
-        self.heap = {}
+        # A shared base dictionary is layered under the words defined here
+        if base is None:
+            self.dictionary = JournaledDict(PRIMITIVES)
+        else:
+            self.dictionary = LayeredDict(base)
+        self.heap = JournaledDict()
+        self.memory = Memory()
+        self.output = Output(size=self.OUTPUT_BUFFER_SIZE)
         self.last_word = None
         self.immediate = True
-        self.backup = deepcopy(self)
-
-    def make_backup(self):
-        self.backup = deepcopy(self)
+        self.imports = {}
+        self.redefinition = (None, None)
+        self.journal = Journal(self)
+        self.profiler = None
+        self.sampler = None
+        self.scheduler = None
+        # Op counts of `run_sliced`, and the registers to return to from a
+        # preempted word
+        self.sliced = False
+        self.ops = 0
+        self.slice_end = None
+        self.ops_limit = None
+        self.resume = None
+
+    def checkpoint(self):
+        self.journal.checkpoint()
+        self.ops = 0
 
     def revert(self):
-        self = deepcopy(self.backup)
+        self.journal.rollback()
+        self.stream.discard()
 
     def enter(self):
         self.return_stack.push(self.ip)
@@ -137,7 +709,220 @@ class VirtualMachine:
     def exit(self):
         self.ip = self.return_stack.pop()
 
+    def enable_profiler(self, profiler=None):
+        """
+        Profile the words executed from now on, returning the `Profiler`.
+        Profiling swaps in timed versions of `execute` and `handle_op`.
+        """
+        if self.profiler is not None and self.profiler.enabled:
+            return self.profiler
+        if self.sliced:
+            raise VmRuntimeError('Cannot profile while running sliced')
+        from .profiler import Profiler
+        (profiler or Profiler()).enable(self)
+        return self.profiler
+
+    def disable_profiler(self):
+        """Stop profiling, keeping the last profile in `self.profiler`."""
+        if self.profiler is not None and self.profiler.enabled:
+            self.profiler.disable(self)
+        return self.profiler
+
+    def start_sampling(self, interval=0.005, mode=None):
+        """Start a `SamplingProfiler` on this machine and return it."""
+        if self.sliced:
+            raise VmRuntimeError('Cannot sample while running sliced')
+        if self.sampler is None or not self.sampler.running:
+            from .profiler import SamplingProfiler
+            self.sampler = SamplingProfiler(self, interval=interval, mode=mode)
+            self.sampler.start()
+        return self.sampler
+
+    def stop_sampling(self):
+        """Stop sampling, keeping the last samples in `self.sampler`."""
+        if self.sampler is not None:
+            self.sampler.stop()
+        return self.sampler
+
+    def close_definition(self, word):
+        """Optimize and thread the code of a word when its definition ends."""
+        word.dependencies = dependencies(word.code)
+        if self.OPTIMIZE:
+            optimize_word(word)
+        new, replaced = self.redefinition
+        if self.LATE_BIND and new is word and replaced is not None:
+            relink(word, replaced, self.dictionary, optimize=self.OPTIMIZE)
+        word.thread()
+
+    def jit_compile(self, word):
+        """Compile a word to Python, marking it if it has to be interpreted."""
+        word.compiled = compile_word(word) or False
+
+    def execute(self, word):
+        """
+        Run a defined word. Calls between defined words push and pop frames
+        on the frame and return stacks instead of nesting Python calls, so
+        the depth of recursion is only bounded by memory. Only the `ret`
+        action returning from a frame returns `RETURN`, so the depth of the
+        frame stack is checked once per return rather than once per op. When
+        an error escapes the word, the frames it left are unwound.
+        """
+        if self.sliced:
+            return self.execute_sliced(word)
+        frames = self.frame_stack
+        depth = len(frames)
+        caller = (len(self.return_stack), self.ip, self.code)
+        try:
+            word.invoke(self)
+            if len(frames) > depth:
+                while True:
+                    ip = self.ip + 1
+                    self.ip = ip
+                    if self.code[ip](self) is RETURN and len(frames) <= depth:
+                        break
+        except IndexError as err:
+            self.unwind(depth, caller)
+            raise index_error(err) from err
+        except BaseException:
+            self.unwind(depth, caller)
+            raise
+        self.code = caller[2]
+
+    def unwind(self, depth, caller):
+        """
+        Drop the frames above `depth` and the return addresses pushed since
+        the `caller` registers were saved, and return to its code.
+        """
+        rdepth, self.ip, self.code = caller
+        del self.frame_stack[depth:]
+        del self.return_stack[rdepth:]
+
+    def execute_sliced(self, word, preemptible=False):
+        """
+        Version of `execute` used by `run_sliced`, counting the ops it runs.
+        A word called from the outer interpreter is preemptible: it stops,
+        with its frames left in place, once the ops of the slice are used
+        up. Words called from builtins always run to completion.
+        """
+        frames = self.frame_stack
+        depth = len(frames)
+        caller = (len(self.return_stack), self.ip, self.code)
+        try:
+            word.invoke(self)
+            if len(frames) > depth:
+                self.run_frames(depth, preemptible)
+        except Preempted:
+            self.resume = caller
+            raise
+        except IndexError as err:
+            self.unwind(depth, caller)
+            raise index_error(err) from err
+        except BaseException:
+            self.unwind(depth, caller)
+            raise
+        self.code = caller[2]
+
+    def run_frames(self, depth, preemptible):
+        frames = self.frame_stack
+        while True:
+            ip = self.ip + 1
+            self.ip = ip
+            ops = self.ops + 1
+            self.ops = ops
+            if ops > self.ops_limit:
+                self.budget_exceeded()
+            if self.code[ip](self) is RETURN and len(frames) <= depth:
+                break
+            if preemptible and ops >= self.slice_end:
+                raise Preempted
+
+    def count_ops(self, n):
+        """Count ops run by another inner interpreter, such as a task's."""
+        self.ops += n
+        if self.sliced and self.ops > self.ops_limit:
+            self.budget_exceeded()
+
+    def budget_exceeded(self):
+        raise BudgetExceeded(f'Instruction budget of {self.ops_limit} ops '
+                             'exceeded')
+
+    def run_sliced(self, ops, limit=None):
+        """
+        Run the input for a slice of about `ops` instructions, returning
+        True once the input is consumed or False if preempted, in which case
+        calling again resumes where it stopped. Instructions are counted
+        from the last `checkpoint`, and `BudgetExceeded` is raised once they
+        exceed `limit`. Builtins and JIT compiled words count as a single
+        instruction. Profiling cannot be turned on while running sliced, as
+        its versions of `execute` do not count instructions.
+        """
+        if self.profiler is not None and self.profiler.enabled:
+            raise VmRuntimeError('Cannot run sliced while profiling')
+        self.ops_limit = float('inf') if limit is None else limit
+        self.slice_end = self.ops + ops
+        self.sliced = True
+        try:
+            if self.frame_stack:
+                # Finish the word preempted in the previous slice
+                try:
+                    self.run_frames(0, preemptible=True)
+                except Preempted:
+                    raise
+                except IndexError as err:
+                    self.unwind(0, self.resume)
+                    raise index_error(err) from err
+                except BaseException:
+                    self.unwind(0, self.resume)
+                    raise
+                self.code = self.resume[2]
+            self.run()
+        except Preempted:
+            return False
+        finally:
+            self.sliced = False
+        return True
+
+    def map_word(self, word, inputs, vectorize=True, array=False):
+        """
+        Run a word on each of a batch of inputs, each a tuple of items
+        pushed on an otherwise empty data stack, and return the list of
+        tuples of items the word leaves. The inputs may also be a NumPy
+        array with one row per input. With `array`, the results are
+        returned as an array with one row per input.
+
+        If NumPy is installed and the word only uses elementwise builtins,
+        it runs once on arrays holding each column of numeric inputs,
+        unless its integer results overflow the 64 bit range of NumPy.
+        Otherwise the word runs once per input on this virtual machine. The data stack is
+        restored afterwards.
+        """
+        if isinstance(word, str):
+            word = self.dictionary[word]
+        saved = self.stack[:]
+        try:
+            outputs = None
+            if vectorize and vectorizable(word):
+                outputs = run_vectorized(self, word, inputs)
+            if outputs is not None:
+                if array:
+                    import numpy as np
+                    return np.stack(outputs, axis=-1)
+                return list(zip(*[col.tolist() for col in outputs]))
+            stack = self.stack
+            results = []
+            for args in as_tuples(inputs):
+                stack[:] = args
+                word(self)
+                results.append(tuple(stack))
+        finally:
+            self.stack[:] = saved
+        if array:
+            import numpy as np
+            return np.array(results)
+        return results
+
     def insert_word(self, word):
+        self.redefinition = (word, self.dictionary.get(word.symbol))
         self.dictionary[word.symbol] = word
         self.last_word = word
 
@@ -156,60 +941,62 @@ class VirtualMachine:
             raise VmRuntimeError('End of stream')
 
     def parse_symbol(self, symb):
-        if is_numeric_literal(symb):
-            return convert_numeric_literal(symb)
-        elif symb in self.dictionary:
+        try:
             return self.dictionary[symb]
-        else:
-            raise VmRuntimeError(f'Undefined symbol: "{symb}"')
+        except KeyError:
+            pass
+        try:
+            return convert_numeric_literal(symb)
+        except ValueError:
+            raise VmRuntimeError(f'Undefined symbol: "{symb}"') from None
 
     def handle_op(self, word):
         if callable(word):
-            word(self)
+            if (self.sliced and not self.frame_stack
+                    and isinstance(word, DefinedWord)):
+                # Only a word called from the outer interpreter is
+                # preempted, as preempting one called from a builtin would
+                # drop the Python frames of its callers
+                self.execute_sliced(word, preemptible=True)
+            else:
+                word(self)
         else:
             self.stack.push(word)
 
     def compile(self, word):
         self.ip += 1
         self.last_word.code.append(word)
+        self.last_word.invalidate()
 
     def run(self):
-        for symb in self.stream:
-            word = self.parse_symbol(symb)
-            if self.immediate:
-                self.handle_op(word)
-            elif hasattr(word, 'immediate') and word.immediate:
-                self.handle_op(word)
-            else:
-                self.compile(word)
+        try:
+            for symb in self.stream:
+                word = self.parse_symbol(symb)
+                if self.immediate:
+                    self.handle_op(word)
+                elif hasattr(word, 'immediate') and word.immediate:
+                    self.handle_op(word)
+                else:
+                    self.compile(word)
+        except IndexError as err:
+            raise index_error(err) from err
+        finally:
+            self.output.flush()
+
+    def run_stream(self, stream, line_buffered=False):
+        """Read and run the words of a text stream as they are consumed."""
+        self.stream = CharStream(stream, line_buffered=line_buffered)
+        self.run()
 
     def read_input(self, text):
-        self.make_backup()
+        self.checkpoint()
         self.stream.write(text)
 
-    def import_module(self, modname):
-        modname += '.sloth'
-        system_path = (
-            Path(os.getcwd()),
-            Path(CONFIG.get('Paths', 'sloth_dir')).expanduser()
-                / Path(CONFIG.get('Paths', 'lib_dir')),
-            Path(__file__).parent.parent / Path('lib'),
-        )
-        for path in system_path:
-            mod_path = path / Path(modname)
-            if mod_path.exists():
-                break
-        else:
-            raise VmRuntimeError(f'Could not find module: "{modname}"')
-        with open(mod_path) as f:
-            text = f.read()
-        mod_vm = VirtualMachine(text)
-        mod_vm.run()
-        public_words = {
-            k: v for k, v in mod_vm.dictionary.items()
-            if hasattr(v, 'hidden') and not v.hidden
-        }
-        self.dictionary.update(public_words)
+    def import_module(self, modname, reload=False):
+        from .modules import REGISTRY
+        module = REGISTRY.load(modname, use_cache=self.USE_CACHE, reload=reload)
+        self.imports.update(module.imports)
+        self.dictionary.update(module.words)
 
 
 def compute(input_str):
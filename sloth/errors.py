@@ -9,7 +9,39 @@ class VmRuntimeError(SlothError):
     pass
 
 
+class StackUnderflow(VmRuntimeError):
+    pass
+
+
+class StackOverflow(VmRuntimeError):
+    pass
+
+
+class BudgetExceeded(VmRuntimeError):
+    pass
+
+
 class WordExit(SlothError):
     pass
 
 
+# Messages of the `IndexError` raised by a list popped or indexed past its
+# bottom, as the data and return stacks are
+LIST_INDEX_ERRORS = frozenset([
+    'pop from empty list', 'pop index out of range',
+    'list index out of range', 'list assignment index out of range',
+])
+
+
+def index_error(err):
+    """
+    The error to raise for an `IndexError` caught by the interpreter loops:
+    a `StackUnderflow` if raised by accessing a stack, or a `VmRuntimeError`
+    with the original message if raised by indexing other data.
+    """
+    message = str(err)
+    if message in LIST_INDEX_ERRORS:
+        return StackUnderflow('Stack underflow')
+    return VmRuntimeError(message)
+
+
@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+Compile the code of a `DefinedWord` into a Python function.
+
+Straight-line runs of stack shufflers and arithmetic are translated into
+operations on local variables, with a symbolic stack tracking which locals
+hold the top items; the real data stack is only touched when a value must
+be popped from it, or "flushed" before a call or branch. The branch patterns
+compiled by `if`/`else`/`then`, `begin`/`until`, `begin`/`again` and
+`begin`/`while`/`repeat` become `if` statements and `while` loops.
+
+Words whose code cannot be compiled, because it uses `does>`, `exit`,
+modifies code with `,` or `w!`, uses the task words that suspend a task, or
+branches in a pattern that has no structured equivalent, are left to the
+interpreter. So are words calling themselves, directly or through other
+defined words: compiled code calls defined words as nested Python calls,
+which would bound the depth of their recursion by that of Python.
+"""
+
+from .primitives import (PRIMITIVES, BuiltinWord, DefinedWord, truth_not,
+                         truth_and, truth_or, maximum, minimum)
+from .optimizer import branch_ops, defuse
+
+
+class Uncompilable(Exception):
+    pass
+
+
+# Stack shufflers as (number of inputs, permutation of the inputs)
+SHUFFLES = {
+    'dup': (1, (0, 0)),
+    'drop': (1, ()),
+    'swap': (2, (1, 0)),
+    'over': (2, (0, 1, 0)),
+    'rot': (3, (1, 2, 0)),
+    '-rot': (3, (2, 0, 1)),
+    '2swap': (4, (2, 3, 0, 1)),
+    '2over': (4, (0, 1, 2, 3, 0, 1)),
+}
+
+# Words replacing the top two items with one
+BINARY_OPS = {
+    '+': '{0} + {1}',
+    '-': '{0} - {1}',
+    '*': '{0} * {1}',
+    '/': '{0} / {1}',
+    '//': '{0} // {1}',
+    'mod': '{0} % {1}',
+    '**': '{0} ** {1}',
+    '=': '{0} == {1}',
+    '<>': '{0} != {1}',
+    '>': '{0} > {1}',
+    '<': '{0} < {1}',
+    '>=': '{0} >= {1}',
+    '<=': '{0} <= {1}',
+    'max': 'maximum({0}, {1})',
+    'min': 'minimum({0}, {1})',
+    'and': 'truth_and({0}, {1})',
+    'or': 'truth_or({0}, {1})',
+}
+
+# Words replacing the top item
+UNARY_OPS = {
+    'neg': '-{0}',
+    'abs': 'abs({0})',
+    '1+': '{0} + 1',
+    '1-': '{0} - 1',
+    'not': 'truth_not({0})',
+}
+
+# Words pushing a test of the top item, which is kept
+TESTS = {
+    '0=': '{0} == 0',
+    '0<>': '{0} != 0',
+    '0<': '{0} < 0',
+    '0>': '{0} > 0',
+    '1=': '{0} == 1',
+}
+
+# Words that depend on the instruction pointer or modify code, and the task
+# words, which may suspend a task to run them again
+UNSUPPORTED = {'does>', 'exit', ',', 'w!', ':', ';', 'yield', 'join', 'send',
+               'recv'}
+
+
+def primitive_table(names):
+    """Map the builtin word objects to their entry in a table by symbol."""
+    return {
+        PRIMITIVES[symbol]: value for symbol, value in names.items()
+        if symbol in PRIMITIVES
+    }
+
+
+def calls_itself(word):
+    """Whether a word can reach a call of itself through defined words."""
+    seen = set()
+    pending = [word]
+    while pending:
+        caller = pending.pop()
+        code = caller.source_code
+        if code is None:
+            code = caller.code
+        for op in code:
+            if isinstance(op, DefinedWord):
+                if op is word:
+                    return True
+                if op not in seen:
+                    seen.add(op)
+                    pending.append(op)
+    return False
+
+
+class Structurer:
+    """
+    Recover structured control flow from the branch offsets of a code list.
+    Produces a tree of nodes:
+
+        ('op', address)          execute a single op
+        ('lit', value)           push a literal
+        ('if', then, else)       pop a flag and run one of two node lists
+        ('loop', body)           loop forever over a node list
+        ('until',)               pop a flag and leave the loop if true
+        ('while',)               pop a flag and leave the loop if false
+        ('break',) ('continue',)
+    """
+    def __init__(self, code):
+        self.code = code
+        self.branch = PRIMITIVES['branch']
+        self.zbranch = PRIMITIVES['0branch']
+        self.tick = PRIMITIVES["[']"]
+        # Fused branches must be expanded by `defuse` before structuring
+        self.fused_branches = branch_ops() - {self.branch, self.zbranch}
+
+    def target(self, i):
+        try:
+            offset = self.code[i+1]
+        except IndexError:
+            raise Uncompilable('Branch without an offset')
+        if type(offset) is not int:
+            raise Uncompilable('Branch offset is not an integer')
+        return i + offset + 2
+
+    def loop_end(self, start, hi):
+        """Address of the last backward branch to `start` before `hi`."""
+        end = None
+        i = start
+        while i < hi:
+            op = self.code[i]
+            if op is self.branch or op is self.zbranch:
+                if self.target(i) == start:
+                    end = i
+                i += 2
+            elif op is self.tick:
+                i += 2
+            else:
+                i += 1
+        return end
+
+    def parse(self, lo, hi, loop=None, header=False):
+        code = self.code
+        nodes = []
+        i = lo
+        while i < hi:
+            if not header or i != lo:
+                end = self.loop_end(i, hi)
+                if end is not None:
+                    body = self.parse(i, end, loop=(i, end+2), header=True)
+                    if code[end] is self.zbranch:
+                        body.append(('until',))
+                    nodes.append(('loop', body))
+                    i = end + 2
+                    continue
+            op = code[i]
+            if op is self.tick:
+                if i + 1 >= hi:
+                    raise Uncompilable('Tick without an operand')
+                nodes.append(('lit', code[i+1]))
+                i += 2
+            elif op is self.zbranch:
+                t = self.target(i)
+                if loop is not None and t == loop[1]:
+                    nodes.append(('while',))
+                    i += 2
+                elif i < t <= hi:
+                    j = t - 2
+                    if (j > i + 1 and code[j] is self.branch
+                            and t <= self.target(j) <= hi):
+                        t_else = self.target(j)
+                        nodes.append(('if', self.parse(i+2, j, loop),
+                                      self.parse(t, t_else, loop)))
+                        i = t_else
+                    else:
+                        nodes.append(('if', self.parse(i+2, t, loop), []))
+                        i = t
+                else:
+                    raise Uncompilable(f'Unstructured "0branch" at {i}')
+            elif op is self.branch:
+                t = self.target(i)
+                if loop is not None and t == loop[1]:
+                    nodes.append(('break',))
+                elif loop is not None and t == loop[0]:
+                    nodes.append(('continue',))
+                else:
+                    raise Uncompilable(f'Unstructured "branch" at {i}')
+                i += 2
+            elif isinstance(op, BuiltinWord) and op in self.fused_branches:
+                raise Uncompilable(f'Fused branch "{op.symbol}" at {i}')
+            elif isinstance(op, BuiltinWord) and op.symbol in UNSUPPORTED:
+                raise Uncompilable(f'Unsupported word "{op.symbol}"')
+            else:
+                nodes.append(('op', i))
+                i += 1
+        return nodes
+
+
+class CodeGen:
+    def __init__(self, word, code):
+        self.word = word
+        self.code = code
+        self.lines = []
+        self.namespace = {
+            'word': word,
+            'truth_not': truth_not,
+            'truth_and': truth_and,
+            'truth_or': truth_or,
+            'maximum': maximum,
+            'minimum': minimum,
+        }
+        self.names = {}
+        self.vstack = []
+        self.counter = 0
+        self.shuffles = primitive_table(SHUFFLES)
+        self.binary_ops = primitive_table(BINARY_OPS)
+        self.unary_ops = primitive_table(UNARY_OPS)
+        self.tests = primitive_table(TESTS)
+        self.rstack_ops = primitive_table({
+            '>r': '>r', 'r>': 'r>', 'i': 'i', 'rdrop': 'rdrop',
+            'r+': 'r+', 'r-': 'r-', 'True': True, 'False': False,
+        })
+
+    def emit(self, line, indent):
+        self.lines.append('    ' * indent + line)
+
+    def fresh(self, prefix='t'):
+        self.counter += 1
+        return f'{prefix}{self.counter}'
+
+    def const(self, value):
+        """Name bound to a constant value in the function namespace."""
+        key = id(value)
+        if key not in self.names:
+            name = self.fresh('k')
+            self.names[key] = name
+            self.namespace[name] = value
+        return self.names[key]
+
+    def assign(self, expr, indent):
+        name = self.fresh()
+        self.emit(f'{name} = {expr}', indent)
+        return name
+
+    def need(self, n, indent):
+        """Ensure the top `n` stack items are held in locals."""
+        missing = n - len(self.vstack)
+        if missing > 0:
+            popped = [self.assign('s.pop()', indent) for _ in range(missing)]
+            self.vstack[:0] = reversed(popped)
+
+    def flush(self, indent):
+        """Push the items held in locals back onto the data stack."""
+        if len(self.vstack) == 1:
+            self.emit(f's.append({self.vstack[0]})', indent)
+        elif self.vstack:
+            self.emit(f's.extend(({", ".join(self.vstack)},))', indent)
+        self.vstack = []
+
+    def pop_flag(self, indent):
+        self.need(1, indent)
+        flag = self.vstack.pop()
+        self.flush(indent)
+        return flag
+
+    def gen_op(self, op, indent):
+        vstack = self.vstack
+        if not isinstance(op, BuiltinWord):
+            # Defined words and literals, which may not be hashable
+            if callable(op):
+                self.flush(indent)
+                self.emit(f'{self.const(op)}(vm)', indent)
+            else:
+                vstack.append(self.const(op))
+        elif op in self.shuffles:
+            n, perm = self.shuffles[op]
+            self.need(n, indent)
+            args = vstack[-n:]
+            vstack[-n:] = [args[k] for k in perm]
+        elif op in self.binary_ops:
+            self.need(2, indent)
+            b = vstack.pop()
+            a = vstack.pop()
+            vstack.append(self.assign(self.binary_ops[op].format(a, b), indent))
+        elif op in self.unary_ops:
+            self.need(1, indent)
+            a = vstack.pop()
+            vstack.append(self.assign(self.unary_ops[op].format(a), indent))
+        elif op in self.tests:
+            self.need(1, indent)
+            vstack.append(self.assign(self.tests[op].format(vstack[-1]), indent))
+        elif op in self.rstack_ops:
+            self.gen_rstack_op(self.rstack_ops[op], indent)
+        else:
+            self.flush(indent)
+            self.emit(f'{self.const(op.func)}(vm)', indent)
+
+    def gen_rstack_op(self, name, indent):
+        vstack = self.vstack
+        if name is True or name is False:
+            vstack.append(str(name))
+        elif name == '>r':
+            self.need(1, indent)
+            self.emit(f'r.append({vstack.pop()})', indent)
+        elif name == 'r>':
+            vstack.append(self.assign('r.pop()', indent))
+        elif name == 'i':
+            vstack.append(self.assign('r[-1]', indent))
+        elif name == 'rdrop':
+            self.emit('r.pop()', indent)
+        elif name == 'r+':
+            self.emit('r[-1] += 1', indent)
+        elif name == 'r-':
+            self.emit('r[-1] -= 1', indent)
+
+    def gen_nodes(self, nodes, indent):
+        code = self.code
+        for node in nodes:
+            kind = node[0]
+            if kind == 'op':
+                self.gen_op(code[node[1]], indent)
+            elif kind == 'lit':
+                self.vstack.append(self.const(node[1]))
+            elif kind == 'if':
+                flag = self.pop_flag(indent)
+                self.emit(f'if {flag}:', indent)
+                self.gen_block(node[1], indent+1)
+                if node[2]:
+                    self.emit('else:', indent)
+                    self.gen_block(node[2], indent+1)
+            elif kind == 'loop':
+                self.flush(indent)
+                self.emit('while True:', indent)
+                self.gen_block(node[1], indent+1)
+            elif kind == 'until':
+                self.emit(f'if {self.pop_flag(indent)}:', indent)
+                self.emit('break', indent+1)
+            elif kind == 'while':
+                self.emit(f'if not {self.pop_flag(indent)}:', indent)
+                self.emit('break', indent+1)
+            else:
+                self.flush(indent)
+                self.emit(kind, indent)
+
+    def gen_block(self, nodes, indent):
+        start = len(self.lines)
+        self.gen_nodes(nodes, indent)
+        self.flush(indent)
+        if len(self.lines) == start:
+            self.emit('pass', indent)
+
+    def generate(self, nodes):
+        self.emit('def compiled(vm):', 0)
+        self.emit('s = vm.stack', 1)
+        self.emit('r = vm.return_stack', 1)
+        self.emit('vm.frame_stack.append(word)', 1)
+        self.emit('r.append(vm.ip)', 1)
+        self.emit('vm.ip = 0', 1)
+        self.gen_block(nodes, 1)
+        self.emit('vm.ip = r.pop()', 1)
+        self.emit('vm.frame_stack.pop()', 1)
+        return '\n'.join(self.lines)
+
+
+def generate_source(word):
+    """Return the Python source and namespace of the compiled word."""
+    # Compile the code from before peephole optimization, as the compiled
+    # function does not need the fused ops. Code modified since, or copied
+    # by `does>`, has its fused ops expanded again.
+    if calls_itself(word):
+        raise Uncompilable(f'Recursive word "{word.symbol}"')
+    code = word.source_code
+    if code is None:
+        code = defuse(word.code)
+        if code is None:
+            raise Uncompilable('Branch offsets cannot be decoded')
+    nodes = Structurer(code).parse(0, len(code))
+    gen = CodeGen(word, code)
+    source = gen.generate(nodes)
+    return source, gen.namespace
+
+
+def compile_word(word):
+    """
+    Compile a `DefinedWord` into a Python function taking the virtual
+    machine, or return None if the word cannot be compiled.
+    """
+    try:
+        source, namespace = generate_source(word)
+    except Uncompilable:
+        return None
+    code = compile(source, f'<jit:{word.symbol}>', 'exec')
+    exec(code, namespace)
+    compiled = namespace['compiled']
+    compiled.source = source
+    return compiled
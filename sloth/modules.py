@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+
+import os
+import pickle
+import hashlib
+import threading
+from types import MappingProxyType
+from pathlib import Path
+from collections import namedtuple
+
+from . import get_config, __version__
+from .errors import VmRuntimeError
+
+
+MODULE_EXT = '.sloth'
+CACHE_EXT = '.pickle'
+
+
+def module_search_path():
+    return (
+        Path(os.getcwd()),
+        Path(get_config().get('Paths', 'sloth_dir')).expanduser()
+            / Path(get_config().get('Paths', 'lib_dir')),
+        Path(__file__).parent.parent / Path('lib'),
+    )
+
+
+def find_module(modname):
+    filen = modname + MODULE_EXT
+    for path in module_search_path():
+        mod_path = path / Path(filen)
+        if mod_path.exists():
+            return mod_path
+    raise VmRuntimeError(f'Could not find module: "{filen}"')
+
+
+def hash_source(source):
+    return hashlib.sha256(source).hexdigest()
+
+
+def read_source(mod_path):
+    """Return the decoded text of a module and the hash of its contents."""
+    with open(mod_path, 'rb') as f:
+        source = f.read()
+    return source.decode(), hash_source(source)
+
+
+def public_words(vm):
+    return {
+        k: v for k, v in vm.dictionary.items()
+        if hasattr(v, 'hidden') and not v.hidden
+    }
+
+
+class ModuleCache:
+    """
+    On-disk cache of the compiled public words of a module. Entries are
+    pickled under `cache_dir` and keyed by the resolved path of the module,
+    the hash of its source and the Sloth version, so that modules of the
+    same name in different directories have their own entries. Each entry
+    also records the hashes of the modules it imported, and is ignored if
+    any of them has changed since.
+    """
+    def __init__(self, cache_dir=None):
+        self._cache_dir = None if cache_dir is None else Path(cache_dir)
+
+    @property
+    def cache_dir(self):
+        # Resolved from the configuration on first use rather than on import
+        if self._cache_dir is None:
+            config = get_config()
+            self._cache_dir = (
+                Path(config.get('Paths', 'sloth_dir')).expanduser()
+                / Path(config.get('Paths', 'cache_dir', fallback='cache'))
+            )
+        return self._cache_dir
+
+    def entry_prefix(self, mod_path):
+        """Name shared by the entries of all versions of a module file."""
+        path_key = hash_source(str(mod_path.resolve()).encode())
+        return f'{mod_path.stem}-{path_key[:16]}'
+
+    def entry_path(self, mod_path, digest):
+        key = hash_source(
+            f'{__version__}:{mod_path.resolve()}:{digest}'.encode())
+        return self.cache_dir / Path(
+            f'{self.entry_prefix(mod_path)}-{key[:32]}{CACHE_EXT}')
+
+    def load(self, mod_path, digest):
+        """
+        Return the cached words and dependencies of a module, or None if
+        there is no valid entry.
+        """
+        try:
+            with open(self.entry_path(mod_path, digest), 'rb') as f:
+                entry = pickle.load(f)
+        except Exception:
+            return None
+        if (entry.get('version') != __version__
+                or entry.get('path') != str(mod_path.resolve())
+                or entry.get('digest') != digest):
+            return None
+        for dep_path, dep_digest in entry['imports'].items():
+            try:
+                with open(dep_path, 'rb') as f:
+                    if hash_source(f.read()) != dep_digest:
+                        return None
+            except OSError:
+                return None
+        return entry['words'], entry['imports']
+
+    def store(self, mod_path, digest, words, imports):
+        entry = {
+            'version': __version__,
+            'path': str(mod_path.resolve()),
+            'digest': digest,
+            'imports': imports,
+            'words': words,
+        }
+        entry_path = self.entry_path(mod_path, digest)
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            # Remove stale entries for previous versions of the same file
+            pattern = f'{self.entry_prefix(mod_path)}-{"?" * 32}{CACHE_EXT}'
+            for stale in self.cache_dir.glob(pattern):
+                if stale != entry_path:
+                    stale.unlink()
+            import tempfile
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, entry_path)
+        except (OSError, pickle.PicklingError, AttributeError, TypeError):
+            # The cache is an optimization, so failing to write it is not
+            # an error for the caller.
+            os.unlink(tmp_path)
+
+    def clear(self):
+        for path in self.cache_dir.glob(f'*{CACHE_EXT}'):
+            path.unlink()
+
+
+Module = namedtuple('Module', 'name path digest words imports')
+
+
+class ModuleRegistry:
+    """
+    Process-wide registry of loaded modules. Each module is interpreted once
+    and every later import links to the same word objects. The mappings of
+    a module are read-only, but not the words in them: machines must not
+    change their code, and redefinitions with late binding relink copies.
+    The only state of a word that changes is its JIT compiled form and call
+    count, which depend on its code alone. A module is only reloaded from
+    its source through `reload`; virtual machines that already imported it
+    keep the old words.
+
+    Imports are thread-safe: a single lock is held while loading, so
+    concurrent imports of the same module wait for a single load. A module
+    importing others loads them under the same reentrant lock, so threads
+    importing modules in different orders cannot deadlock.
+    """
+    def __init__(self, cache=None):
+        self.cache = ModuleCache() if cache is None else cache
+        self.modules = {}
+        self.lock = threading.RLock()
+        self.local = threading.local()
+
+    def load(self, modname, use_cache=True, reload=False):
+        mod_path = find_module(modname)
+        key = str(mod_path.resolve())
+        loading = self.local.__dict__.setdefault('loading', [])
+        if key in loading:
+            raise VmRuntimeError(f'Circular import of module: "{modname}"')
+        with self.lock:
+            module = self.modules.get(key)
+            if module is None or reload:
+                loading.append(key)
+                try:
+                    module = self.read_module(modname, mod_path, use_cache)
+                finally:
+                    loading.pop()
+                self.modules[key] = module
+        return module
+
+    def reload(self, modname, use_cache=True):
+        return self.load(modname, use_cache=use_cache, reload=True)
+
+    def read_module(self, modname, mod_path, use_cache):
+        from .core import VirtualMachine
+        text, digest = read_source(mod_path)
+        cached = self.cache.load(mod_path, digest) if use_cache else None
+        if cached is not None:
+            words, imports = cached
+        else:
+            mod_vm = VirtualMachine(text)
+            mod_vm.USE_CACHE = use_cache
+            mod_vm.run()
+            words = public_words(mod_vm)
+            imports = mod_vm.imports
+            if use_cache:
+                self.cache.store(mod_path, digest, words, imports)
+        imports = dict(imports)
+        imports[str(mod_path.resolve())] = digest
+        return Module(modname, mod_path, digest, MappingProxyType(words),
+                      MappingProxyType(imports))
+
+    def clear(self):
+        with self.lock:
+            self.modules.clear()
+
+
+REGISTRY = ModuleRegistry()
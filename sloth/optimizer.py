@@ -0,0 +1,510 @@
+#!/usr/bin/env python3
+"""
+Optimization of the code of a `DefinedWord` when its definition is closed
+with `;`. Short branch-free words are inlined, literal-only arithmetic is
+folded, and common sequences of ops are rewritten into fused builtin
+"superinstructions". Branch offsets are recomputed for the rewritten code.
+"""
+
+import copy
+import operator
+from collections import Counter
+
+from .primitives import (PRIMITIVES, Word, BuiltinWord, DefinedWord, maximum,
+                         minimum)
+
+
+# Counts of adjacent op pairs seen in compiled definitions, and of the
+# fusions applied, for tuning the superinstruction table.
+PAIR_COUNTS = Counter()
+FUSION_COUNTS = Counter()
+
+SUPERINSTRUCTIONS = {}
+
+BINARY_FUNCS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+    '//': operator.floordiv,
+    'mod': operator.mod,
+    '**': operator.pow,
+    'max': maximum,
+    'min': minimum,
+    '=': operator.eq,
+    '<>': operator.ne,
+    '>': operator.gt,
+    '<': operator.lt,
+    '>=': operator.ge,
+    '<=': operator.le,
+}
+
+UNARY_FUNCS = {
+    'neg': operator.neg,
+    'abs': abs,
+    '1+': lambda v: v + 1,
+    '1-': lambda v: v - 1,
+}
+
+COMPARISONS = ('=', '<>', '>', '<', '>=', '<=')
+
+# Maximum number of ops in the body of an inlined word
+INLINE_SIZE = 4
+
+# Words that depend on the frame of the word executing them
+NOT_INLINABLE = {'>r', 'r>', 'rdrop', 'i', 'r+', 'r-', 'rp@', 'exit', 'does>'}
+
+
+def lookup_superinstruction(symbol):
+    return SUPERINSTRUCTIONS[symbol]
+
+
+class FusedWord(BuiltinWord):
+    """A builtin word executing a fused sequence of ops."""
+    def __init__(self, func, symbol, parts):
+        super().__init__(func, symbol=symbol)
+        self.parts = parts
+
+    def __reduce__(self):
+        return (lookup_superinstruction, (self.symbol,))
+
+
+class LiteralOp(BuiltinWord):
+    """A binary operation with its right operand fused in as a constant."""
+    def __init__(self, symbol, value):
+        func = BINARY_FUNCS[symbol]
+        def literal_op(vm):
+            ds = vm.stack
+            ds[-1] = func(ds[-1], value)
+        super().__init__(literal_op, symbol=f'{value} {symbol}')
+        self.op_symbol = symbol
+        self.value = value
+        self.parts = (value, PRIMITIVES[symbol])
+
+    def __reduce__(self):
+        return (LiteralOp, (self.op_symbol, self.value))
+
+
+class CompileOp(BuiltinWord):
+    """Fused `['] word ,` appending a word to the last defined word."""
+    def __init__(self, word):
+        def compile_op(vm):
+            vm.last_word.code.append(word)
+            vm.last_word.invalidate()
+        super().__init__(compile_op, symbol=f"['] {word} ,")
+        self.word = word
+        self.parts = (PRIMITIVES["[']"], word, PRIMITIVES[','])
+
+    def __reduce__(self):
+        return (CompileOp, (self.word,))
+
+
+class RegisterFused:
+    def __init__(self, *symbols):
+        self.symbols = symbols
+
+    def __call__(self, func):
+        symbol = '({0})'.format(' '.join(self.symbols))
+        parts = tuple(PRIMITIVES[s] for s in self.symbols)
+        SUPERINSTRUCTIONS[symbol] = FusedWord(func, symbol, parts)
+        return func
+
+
+##############################################################################
+#                           Superinstructions
+##############################################################################
+
+@RegisterFused('over', 'over')
+def over_over(vm):
+    ds = vm.stack
+    ds.extend((ds[-2], ds[-1]))
+
+
+@RegisterFused('dup', '*')
+def dup_mul(vm):
+    ds = vm.stack
+    ds[-1] = ds[-1] * ds[-1]
+
+
+@RegisterFused('dup', '+')
+def dup_add(vm):
+    ds = vm.stack
+    ds[-1] = ds[-1] + ds[-1]
+
+
+@RegisterFused('over', '+')
+def over_add(vm):
+    ds = vm.stack
+    ds[-1] = ds[-1] + ds[-2]
+
+
+@RegisterFused('swap', '-')
+def swap_sub(vm):
+    ds = vm.stack
+    v = ds.pop()
+    ds[-1] = v - ds[-1]
+
+
+@RegisterFused('swap', 'drop')
+def swap_drop(vm):
+    del vm.stack[-2]
+
+
+@RegisterFused('drop', 'drop')
+def drop_drop(vm):
+    ds = vm.stack
+    ds.pop()
+    ds.pop()
+
+
+def compare_branch(compare):
+    def func(vm):
+        ds = vm.stack
+        v = ds.pop()
+        if compare(ds.pop(), v):
+            vm.ip += 1
+        else:
+            vm.ip += vm.next_compiled_instr() + 1
+    return func
+
+
+for _symbol in COMPARISONS:
+    RegisterFused(_symbol, '0branch')(compare_branch(BINARY_FUNCS[_symbol]))
+
+
+def branch_ops():
+    """Ops followed by a branch offset operand."""
+    ops = {PRIMITIVES['branch'], PRIMITIVES['0branch']}
+    ops.update(
+        word for word in SUPERINSTRUCTIONS.values()
+        if word.parts[-1] is PRIMITIVES['0branch']
+    )
+    return ops
+
+
+##############################################################################
+#                               Optimizer
+##############################################################################
+
+class Instr:
+    """An op with its operand, if any, and the index of its branch target."""
+    __slots__ = ('op', 'operands', 'target')
+
+    def __init__(self, op, operands=(), target=None):
+        self.op = op
+        self.operands = operands
+        self.target = target
+
+    def __len__(self):
+        return 1 + len(self.operands)
+
+
+def decode(code):
+    """
+    Split a code list into instructions, resolving branch offsets into
+    instruction indices. Returns None if a branch does not land on an
+    instruction boundary.
+    """
+    branches = branch_ops()
+    tick = PRIMITIVES["[']"]
+    instrs = []
+    addresses = {}
+    i = 0
+    while i < len(code):
+        op = code[i]
+        addresses[i] = len(instrs)
+        # Literals such as arrays may not be hashable
+        is_branch = isinstance(op, BuiltinWord) and op in branches
+        if (is_branch or op is tick) and i + 1 < len(code):
+            instrs.append(Instr(op, (code[i+1],)))
+            i += 2
+        else:
+            instrs.append(Instr(op))
+            i += 1
+    addresses[len(code)] = len(instrs)
+    address = 0
+    for instr in instrs:
+        if isinstance(instr.op, BuiltinWord) and instr.op in branches:
+            offset = instr.operands[0]
+            if type(offset) is not int:
+                return None
+            target = address + offset + 2
+            if target not in addresses:
+                return None
+            instr.target = addresses[target]
+        address += len(instr)
+    return instrs
+
+
+def encode(instrs):
+    """Join instructions into a code list, recomputing branch offsets."""
+    addresses = []
+    address = 0
+    for instr in instrs:
+        addresses.append(address)
+        address += len(instr)
+    addresses.append(address)
+    code = []
+    for ix, instr in enumerate(instrs):
+        code.append(instr.op)
+        if instr.target is not None:
+            code.append(addresses[instr.target] - addresses[ix] - 2)
+        else:
+            code.extend(instr.operands)
+    return code
+
+
+def is_word(op, symbol):
+    return op is PRIMITIVES.get(symbol)
+
+
+def fuse_pair(first, second):
+    """Return the instruction fusing two instructions, or None."""
+    a, b = first.op, second.op
+    if first.operands:
+        if is_word(a, "[']") and is_word(b, ','):
+            return Instr(CompileOp(first.operands[0]))
+        return None
+    if isinstance(b, BuiltinWord) and b.symbol in BINARY_FUNCS and not callable(a):
+        if b is PRIMITIVES[b.symbol]:
+            return Instr(LiteralOp(b.symbol, a))
+    for word in SUPERINSTRUCTIONS.values():
+        if len(word.parts) == 2 and word.parts[0] is a and word.parts[1] is b:
+            if second.target is not None:
+                return Instr(word, second.operands, second.target)
+            elif not second.operands:
+                return Instr(word)
+    return None
+
+
+def symbol_of(op):
+    return op.symbol if hasattr(op, 'symbol') else 'literal'
+
+
+def is_literal(instr):
+    return not instr.operands and not callable(instr.op)
+
+
+def retarget(result, origins, length):
+    """
+    Point the branch targets of rewritten instructions at their new indices.
+    `origins` holds the index of the instruction each result came from, or
+    None for instructions spliced in after it. A target whose instruction was
+    removed is moved to the next remaining instruction.
+    """
+    new_index = {}
+    for ix, origin in enumerate(origins):
+        if origin is not None:
+            new_index.setdefault(origin, ix)
+    new_index.setdefault(length, len(result))
+    for instr in result:
+        if instr.target is not None:
+            target = instr.target
+            while target not in new_index:
+                target += 1
+            instr.target = new_index[target]
+    return result
+
+
+def branch_targets(instrs):
+    return {instr.target for instr in instrs if instr.target is not None}
+
+
+def inline_body(callee, word):
+    """
+    Instructions of a short, branch-free callee to splice into `word`, or
+    None if the callee should be called.
+    """
+    if (not isinstance(callee, DefinedWord) or callee is word
+            or callee.immediate or len(callee.code) > INLINE_SIZE):
+        return None
+    instrs = decode(callee.code)
+    if instrs is None:
+        return None
+    branches = branch_ops()
+    for instr in instrs:
+        if ((isinstance(instr.op, BuiltinWord) and instr.op in branches)
+                or symbol_of(instr.op) in NOT_INLINABLE):
+            return None
+    return instrs
+
+
+def inline_calls(instrs, word):
+    """Splice the bodies of short words into the instructions of `word`."""
+    result = []
+    origins = []
+    for ix, instr in enumerate(instrs):
+        body = inline_body(instr.op, word)
+        if body is None:
+            result.append(instr)
+            origins.append(ix)
+            continue
+        word.dependencies.add(instr.op)
+        word.dependencies.update(instr.op.dependencies)
+        for n, inlined in enumerate(body):
+            result.append(Instr(inlined.op, inlined.operands))
+            origins.append(ix if n == 0 else None)
+    return retarget(result, origins, len(instrs))
+
+
+def fold(ops):
+    """Value of a sequence of literals followed by a word, or None."""
+    *args, op = ops
+    try:
+        if len(args) == 2 and op.symbol in BINARY_FUNCS:
+            return (BINARY_FUNCS[op.symbol](*args),)
+        if len(args) == 1 and op.symbol in UNARY_FUNCS:
+            return (UNARY_FUNCS[op.symbol](*args),)
+    except (ArithmeticError, TypeError, ValueError):
+        pass
+    return None
+
+
+def fold_constants(instrs):
+    """Evaluate literal-only arithmetic, e.g. `3 4 +` becomes `7`."""
+    targets = branch_targets(instrs)
+    result = []
+    origins = []
+    for ix, instr in enumerate(instrs):
+        result.append(instr)
+        origins.append(ix)
+        op = instr.op
+        if (not isinstance(op, BuiltinWord) or instr.operands
+                or op is not PRIMITIVES.get(op.symbol)):
+            continue
+        for n_args in (2, 1):
+            group = result[-n_args-1:-1]
+            if (len(group) < n_args or not all(map(is_literal, group))
+                    or any(o in targets for o in origins[-n_args:])):
+                continue
+            value = fold([g.op for g in group] + [op])
+            if value is not None:
+                origin = origins[-n_args-1]
+                del result[-n_args-1:]
+                del origins[-n_args-1:]
+                result.append(Instr(value[0]))
+                origins.append(origin)
+                FUSION_COUNTS[f'fold {op.symbol}'] += 1
+                break
+    return retarget(result, origins, len(instrs))
+
+
+def peephole(instrs):
+    """Fuse adjacent instructions into superinstructions."""
+    targets = branch_targets(instrs)
+    for first, second in zip(instrs, instrs[1:]):
+        PAIR_COUNTS[symbol_of(first.op), symbol_of(second.op)] += 1
+    result = []
+    origins = []
+    ix = 0
+    while ix < len(instrs):
+        instr = instrs[ix]
+        origins.append(ix)
+        if ix + 1 < len(instrs) and ix + 1 not in targets:
+            fused = fuse_pair(instr, instrs[ix+1])
+            if fused is not None:
+                FUSION_COUNTS[fused.op.symbol] += 1
+                result.append(fused)
+                ix += 2
+                continue
+        result.append(instr)
+        ix += 1
+    return retarget(result, origins, len(instrs))
+
+
+def defuse(code):
+    """
+    Expand the fused ops of an optimized code list back into the ops they
+    were fused from, recomputing branch offsets. Returns None if the code
+    cannot be decoded.
+    """
+    instrs = decode(code)
+    if instrs is None:
+        return None
+    result = []
+    origins = []
+    for ix, instr in enumerate(instrs):
+        parts = getattr(instr.op, 'parts', None)
+        if not isinstance(instr.op, BuiltinWord) or parts is None:
+            result.append(instr)
+            origins.append(ix)
+            continue
+        if instr.target is not None:
+            # The offset of a fused branch belongs to its final branch
+            expanded = [Instr(op) for op in parts[:-1]]
+            expanded.append(Instr(parts[-1], instr.operands, instr.target))
+        else:
+            expanded = decode(list(parts))
+        for n, part in enumerate(expanded):
+            result.append(part)
+            origins.append(ix if n == 0 else None)
+    return encode(retarget(result, origins, len(instrs)))
+
+
+def dependencies(code):
+    return {op for op in code if isinstance(op, Word)}
+
+
+def optimize_word(word):
+    """
+    Rewrite the code of a word in place by inlining short words, folding
+    constants and fusing superinstructions. The unoptimized code is kept as
+    `word.source_code`, for the JIT compiler and for relinking.
+    """
+    instrs = decode(word.code)
+    if instrs is None:
+        return
+    source_code = list(word.code)
+    instrs = inline_calls(instrs, word)
+    instrs = fold_constants(instrs)
+    code = encode(peephole(instrs))
+    if code != source_code:
+        word.code[:] = code
+        word.source_code = source_code
+
+
+def relink(word, old, dictionary, optimize=True):
+    """
+    Late binding: make the words that depend on `old` use its redefinition
+    `word` instead, recompiling them from their unoptimized code.
+
+    The dependents, and the words depending on them in turn, are replaced
+    in the dictionary by relinked copies rather than changed in place, as
+    the words of modules and of a shared base dictionary are shared with
+    other machines. A journaled dictionary thus logs the replacements, so
+    rolling it back restores the previous words.
+    """
+    replaced = {old: word}
+    keys = {}
+    pending = True
+    while pending:
+        pending = False
+        for key, dependent in list(dictionary.items()):
+            if (isinstance(dependent, DefinedWord) and dependent is not word
+                    and dependent not in replaced
+                    and not dependent.dependencies.isdisjoint(replaced)):
+                replaced[dependent] = copy.copy(dependent)
+                keys[dependent] = key
+                pending = True
+    for dependent, key in keys.items():
+        new = replaced[dependent]
+        code = dependent.code if dependent.source_code is None else dependent.source_code
+        code = [replaced.get(op, op) if isinstance(op, Word) else op
+                for op in code]
+        new.code = code
+        new.invalidate()
+        new.dependencies = dependencies(code)
+        if optimize:
+            optimize_word(new)
+        dictionary[key] = new
+
+
+def fusion_report(limit=20):
+    """Format the most common op pairs and the fusions applied."""
+    lines = ['fused:']
+    for symbol, count in FUSION_COUNTS.most_common(limit):
+        lines.append(f'  {count:>8}  {symbol}')
+    lines.append('pairs:')
+    for (a, b), count in PAIR_COUNTS.most_common(limit):
+        lines.append(f'  {count:>8}  {a} {b}')
+    return '\n'.join(lines)
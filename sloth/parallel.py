@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Run many independent Sloth programs across a pool of worker processes.
+
+Each worker imports the library modules once, when it starts, and then
+runs every program it receives on a fresh virtual machine linked to those
+modules. Programs are sent to the workers in chunks and their results come
+back in the order the programs were given.
+
+    python -m sloth.parallel --jobs 8 a.sloth b.sloth -e '3 4 +'
+"""
+
+import os
+import sys
+import pickle
+import argparse
+import contextlib
+from io import StringIO
+from pathlib import Path
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+
+Result = namedtuple('Result', 'name stack output error')
+
+# Modules imported by every program, set once per worker process
+WORKER_MODULES = ()
+
+
+def init_worker(modules):
+    """Load the modules into the registry of a worker process."""
+    global WORKER_MODULES
+    from .modules import REGISTRY
+    for modname in modules:
+        REGISTRY.load(modname)
+    WORKER_MODULES = tuple(modules)
+
+
+def portable(item):
+    """
+    A stack item as sent back from a worker: the item itself, or its repr if
+    it cannot be pickled, such as an open file or a memory map.
+    """
+    try:
+        pickle.dumps(item)
+    except Exception:
+        return repr(item)
+    return item
+
+
+def run_program(program):
+    """
+    Run a program, given as source text or as a `Path` to a file, and
+    return its `Result`. Errors, and exiting with a non-zero status, are
+    reported in the result rather than raised, so that one failing program
+    does not stop the batch.
+    """
+    from .core import VirtualMachine
+    if isinstance(program, Path):
+        name = str(program)
+        text = program.read_text()
+    else:
+        name = '<string>'
+        text = program
+    output = StringIO()
+    error = None
+    vm = VirtualMachine(text)
+    with contextlib.redirect_stdout(output):
+        try:
+            for modname in WORKER_MODULES:
+                vm.import_module(modname)
+            vm.run()
+        except SystemExit as err:
+            # The program ran `bye`, or exited with an error status
+            if err.code not in (None, 0):
+                error = f'SystemExit: {err.code}'
+        except Exception as err:
+            error = f'{type(err).__name__}: {err}'
+    stack = [portable(item) for item in vm.stack]
+    return Result(name, stack, output.getvalue(), error)
+
+
+def default_chunksize(n_programs, jobs):
+    # A few chunks per worker balances the load of uneven programs against
+    # the cost of sending each chunk.
+    return max(1, n_programs // (jobs * 4))
+
+
+def run_programs(programs, jobs=None, chunksize=None, modules=('std',)):
+    """
+    Run programs, each source text or a `Path`, on `jobs` worker processes
+    (by default one per CPU), and return the list of their results in order.
+    With a single job the programs run in this process.
+    """
+    programs = list(programs)
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = default_chunksize(len(programs), jobs)
+    if jobs == 1:
+        global WORKER_MODULES
+        saved = WORKER_MODULES
+        init_worker(modules)
+        try:
+            return [run_program(program) for program in programs]
+        finally:
+            WORKER_MODULES = saved
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                             initargs=(tuple(modules),)) as executor:
+        return list(executor.map(run_program, programs, chunksize=chunksize))
+
+
+def run_files(paths, **kwargs):
+    return run_programs([Path(path) for path in paths], **kwargs)
+
+
+def programs_in_order(argv, args):
+    """
+    The files and `-e` sources of the parsed `args`, in the order they were
+    given in `argv`, as argparse collects them in separate lists.
+    """
+    files = iter(args.files)
+    exprs = iter(args.exprs)
+    programs = []
+    tokens = iter(argv)
+    for token in tokens:
+        if token == '--':
+            break
+        if token == '-e':
+            next(tokens)
+            programs.append(next(exprs))
+        elif token.startswith('-e'):
+            programs.append(next(exprs))
+        elif token in ('-j', '--jobs', '--chunksize'):
+            next(tokens)
+        elif not token.startswith('-') or token == '-':
+            programs.append(Path(next(files)))
+    programs.extend(Path(f) for f in files)
+    return programs
+
+
+def print_results(results):
+    """
+    Print the output, errors and data stack of each result, returning the
+    exit status: 1 if any program failed, else 0.
+    """
+    status = 0
+    for result in results:
+        print(f'==> {result.name}')
+        sys.stdout.write(result.output)
+        if result.error is not None:
+            print(f'{result.name}: {result.error}', file=sys.stderr)
+            status = 1
+        stack = ' '.join(str(x) for x in result.stack)
+        print(f'data: [{stack}]')
+    return status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Run Sloth programs in parallel worker processes.')
+    parser.add_argument('files', nargs='*', help='Sloth source files')
+    parser.add_argument('-e', dest='exprs', action='append', default=[],
+                        metavar='SOURCE', help='source text to run')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes')
+    parser.add_argument('--chunksize', type=int, default=None)
+    parser.add_argument('--no-std', action='store_true',
+                        help='do not import the standard library')
+    if argv is None:
+        argv = sys.argv[1:]
+    args = parser.parse_intermixed_args(argv)
+    programs = programs_in_order(argv, args)
+    modules = () if args.no_std else ('std',)
+    results = run_programs(programs, jobs=args.jobs,
+                           chunksize=args.chunksize, modules=modules)
+    return print_results(results)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
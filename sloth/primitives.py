@@ -1,14 +1,12 @@
 #!/usr/bin/env python3
 
+import os
 import sys
+import mmap
 import operator
-import textwrap
 from functools import wraps
-from collections import deque
 
-from termcolor import colored
-
-from .errors import VmRuntimeError, WordExit
+from .errors import VmRuntimeError, StackOverflow
 
 
 PRIMITIVES = {}
@@ -30,29 +28,127 @@ class BuiltinWord(Word):
     def __call__(self, vm):
         self.func(vm)
 
+    def __reduce__(self):
+        # Pickle builtins by reference so that cached modules link to the
+        # primitives of the running interpreter.
+        return (lookup_primitive, (self.symbol,))
+
+
+def literal(value):
+    """Threaded code action that pushes a literal value."""
+    def push_literal(vm):
+        vm.stack.push(value)
+    return push_literal
+
+
+def thread_op(op):
+    """Pre-bind a compiled op to the action that executes it."""
+    if isinstance(op, BuiltinWord):
+        return op.func
+    elif isinstance(op, DefinedWord):
+        return op.invoke
+    elif callable(op):
+        return op
+    else:
+        return literal(op)
+
 
 class DefinedWord(Word):
     def __init__(self, symbol):
         self.symbol = symbol
         self.immediate = False
         self.code = []
+        self.threaded = None
+        self.compiled = None
+        self.calls = 0
+        self.source_code = None
+        self.dependencies = set()
         self.definition_text = None
         self.stack_effect = None
         self.hidden = False
         self.text_location = None
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['threaded']
+        del state['compiled']
+        del state['calls']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.threaded = None
+        self.compiled = None
+        self.calls = 0
+
+    def thread(self):
+        """
+        Build the threaded form of the code, where each slot holds the
+        action for the op at the same address: a direct call of a builtin
+        function, a call pushing the frame of a defined word, or a push of a
+        literal. Operands such as branch offsets get a slot as well, but are
+        skipped over at runtime. A final slot returns from the word.
+        """
+        self.threaded = [thread_op(op) for op in self.code]
+        self.threaded.append(ret)
+        return self.threaded
+
+    def invalidate(self):
+        """Discard the threaded and compiled forms of a modified code list."""
+        self.threaded = None
+        self.compiled = None
+        self.calls = 0
+        self.source_code = None
+
+    def invoke(self, vm):
+        """
+        Threaded code action calling the word, by pushing its frame for the
+        inner interpreter of `VirtualMachine.execute` to run.
+        """
+        threshold = vm.JIT_THRESHOLD
+        if threshold is not None:
+            # The compiled form of a module word is shared with the machines
+            # that imported it, but only used by those with the JIT on
+            compiled = self.compiled
+            if compiled:
+                compiled(vm)
+                return
+            if compiled is None:
+                self.calls += 1
+                if self.calls >= threshold:
+                    vm.jit_compile(self)
+        rs = vm.return_stack
+        rs.append(vm.ip)
+        if len(rs) > rs.limit or len(vm.stack) > vm.stack.limit:
+            rs.pop()
+            raise StackOverflow(f'Stack overflow calling "{self.symbol}"')
+        vm.frame_stack.append(self)
+        vm.code = self.threaded or self.thread()
+        # Incremented to the first address by the inner interpreter
+        vm.ip = -1
+
     def __call__(self, vm):
-        vm.frame_stack.push(self)
-        vm.enter()
-        while True:
-            try:
-                op = self.code[vm.ip]
-            except (IndexError, WordExit):
-                break
-            vm.handle_op(op)
-            vm.ip += 1
-        vm.exit()
-        vm.frame_stack.pop()
+        vm.execute(self)
+
+
+# Returned by `ret`, and only by it, to signal the inner interpreter that the
+# frame stack has shrunk
+RETURN = object()
+
+
+def ret(vm):
+    """Threaded code action returning from the word in the top frame."""
+    vm.ip = vm.return_stack.pop()
+    frames = vm.frame_stack
+    frames.pop()
+    if frames:
+        caller = frames[-1]
+        vm.code = caller.threaded or caller.thread()
+    return RETURN
+
+
+def lookup_primitive(symbol):
+    return PRIMITIVES[symbol]
 
 
 class RegisterBuiltin:
@@ -118,22 +214,36 @@ def pow(vm):
 
 @RegisterBuiltin('1+')
 def oneplus(vm):
-    vm.stack.top += 1
+    ds = vm.stack
+    ds[-1] = ds[-1] + 1
 
 
 @RegisterBuiltin('1-')
 def oneminus(vm):
-    vm.stack.top -= 1
+    ds = vm.stack
+    ds[-1] = ds[-1] - 1
+
+
+def maximum(a, b):
+    if is_array(a) or is_array(b):
+        return sys.modules['numpy'].maximum(a, b)
+    return max(a, b)
+
+
+def minimum(a, b):
+    if is_array(a) or is_array(b):
+        return sys.modules['numpy'].minimum(a, b)
+    return min(a, b)
 
 
 @RegisterBuiltin('max')
 def max_(vm):
-    vm.stack.binary_op(max)
+    vm.stack.binary_op(maximum)
 
 
 @RegisterBuiltin('min')
 def min_(vm):
-    vm.stack.binary_op(min)
+    vm.stack.binary_op(minimum)
 
 
 @RegisterBuiltin('abs')
@@ -187,46 +297,75 @@ def le(vm):
 
 @RegisterBuiltin('0=')
 def zero_eq(vm):
-    vm.stack.push(vm.stack.top == 0)
+    ds = vm.stack
+    ds.append(ds[-1] == 0)
 
 
 @RegisterBuiltin('0<>')
 def zero_ne(vm):
-    vm.stack.push(vm.stack.top != 0)
+    ds = vm.stack
+    ds.append(ds[-1] != 0)
 
 
 @RegisterBuiltin('0<')
 def zero_lt(vm):
-    vm.stack.push(vm.stack.top < 0)
+    ds = vm.stack
+    ds.append(ds[-1] < 0)
 
 
 @RegisterBuiltin('0>')
 def zero_gt(vm):
-    vm.stack.push(vm.stack.top > 0)
+    ds = vm.stack
+    ds.append(ds[-1] > 0)
 
 
 @RegisterBuiltin('1=')
 def one_eq(vm):
-    vm.stack.push(vm.stack.top == 1)
+    ds = vm.stack
+    ds.append(ds[-1] == 1)
+
+
+def is_array(value):
+    """Whether a value is a NumPy array or scalar, without importing NumPy."""
+    return type(value).__module__ == 'numpy'
+
+
+def truth_not(a):
+    if is_array(a):
+        return sys.modules['numpy'].logical_not(a)
+    return not a
+
+
+def truth_and(a, b):
+    if is_array(a) or is_array(b):
+        return sys.modules['numpy'].logical_and(a, b)
+    return a and b
+
+
+def truth_or(a, b):
+    if is_array(a) or is_array(b):
+        return sys.modules['numpy'].logical_or(a, b)
+    return a or b
 
 
 @RegisterBuiltin('not')
 def logical_not(vm):
-    vm.stack.top = not vm.stack.top
+    ds = vm.stack
+    ds[-1] = truth_not(ds[-1])
 
 
 @RegisterBuiltin('and')
 def logical_and(vm):
-    v1 = vm.stack.pop()
-    v2 = vm.stack.pop()
-    vm.stack.push(v2 and v1)
+    ds = vm.stack
+    v = ds.pop()
+    ds[-1] = truth_and(ds[-1], v)
 
 
 @RegisterBuiltin('or')
 def logical_or(vm):
-    v1 = vm.stack.pop()
-    v2 = vm.stack.pop()
-    vm.stack.push(v2 or v1)
+    ds = vm.stack
+    v = ds.pop()
+    ds[-1] = truth_or(ds[-1], v)
 
 
 ##############################################################################
@@ -246,18 +385,20 @@ def swap(vm):
 
 @RegisterBuiltin()
 def dup(vm):
-    vm.stack.push(vm.stack.top)
+    ds = vm.stack
+    ds.append(ds[-1])
 
 
 @RegisterBuiltin()
 def over(vm):
-    vm.stack.push(vm.stack[-2])
+    ds = vm.stack
+    ds.append(ds[-2])
 
 
 @RegisterBuiltin('2over')
 def two_over(vm):
-    vm.stack.push(vm.stack[-4])
-    vm.stack.push(vm.stack[-4])
+    ds = vm.stack
+    ds.extend((ds[-4], ds[-3]))
 
 
 @RegisterBuiltin()
@@ -280,7 +421,7 @@ def twoswap(vm):
 
 @RegisterBuiltin('?dup')
 def qdup(vm):
-    if vm.stack.top:
+    if vm.stack[-1]:
         dup(vm)
 
 
@@ -332,17 +473,17 @@ def rpointer(vm):
 
 @RegisterBuiltin('r+')
 def rplus(vm):
-    vm.return_stack.top += 1
+    vm.return_stack[-1] += 1
 
 
 @RegisterBuiltin('r-')
 def rplus(vm):
-    vm.return_stack.top -= 1
+    vm.return_stack[-1] -= 1
 
 
 @RegisterBuiltin('i')
 def eye(vm):
-    vm.stack.push(vm.return_stack.top)
+    vm.stack.push(vm.return_stack[-1])
 
 
 @RegisterBuiltin()
@@ -356,15 +497,15 @@ def here(vm):
 
 @RegisterBuiltin()
 def exit(vm):
-    if len(vm.return_stack) == 0:
+    if len(vm.frame_stack) == 0:
         raise VmRuntimeError('Error in "exit": cannot exit outside of a definition')
     else:
-        raise WordExit
+        return ret(vm)
 
 
 @RegisterBuiltin('.r')
 def print_rstack(vm):
-    print(vm.return_stack)
+    vm.output.print(vm.return_stack)
 
 
 ##############################################################################
@@ -373,12 +514,44 @@ def print_rstack(vm):
 
 # TODO
 # stdin
-# stdout
-# files
 
-@RegisterBuiltin()
+@RegisterBuiltin(stack_effect='( c -- )')
 def emit(vm):
-    print(chr(vm.stack.pop()))
+    """Output the character with code point c."""
+    vm.output.write(chr(vm.stack.pop()))
+
+
+@RegisterBuiltin('.', stack_effect='( x -- )')
+def dot(vm):
+    """Output the top item followed by a space."""
+    vm.output.write(f'{vm.stack.pop()} ')
+
+
+@RegisterBuiltin('type', stack_effect='( s -- )')
+def type_(vm):
+    """Output a string."""
+    vm.output.write(str(vm.stack.pop()))
+
+
+@RegisterBuiltin(stack_effect='( -- )')
+def cr(vm):
+    vm.output.write('\n')
+
+
+@RegisterBuiltin(stack_effect='( -- )')
+def space(vm):
+    vm.output.write(' ')
+
+
+@RegisterBuiltin(stack_effect='( n -- )')
+def spaces(vm):
+    vm.output.write(' ' * vm.stack.pop())
+
+
+@RegisterBuiltin(stack_effect='( -- )')
+def flush(vm):
+    """Write any buffered output."""
+    vm.output.flush()
 
 
 @RegisterBuiltin()
@@ -393,29 +566,112 @@ def word(vm):
     vm.stack.push(symb)
 
 
+@RegisterBuiltin('s"', immediate=True)
+def string_literal(vm):
+    """Push the text up to the next double quote, or compile it as a literal."""
+    text = accum_until(vm, '"')
+    if vm.immediate:
+        vm.stack.push(text)
+    else:
+        vm.compile(text)
+
+
+##############################################################################
+#                                  Files
+##############################################################################
+
+@RegisterBuiltin('r/o', stack_effect='( -- mode )')
+def read_only(vm):
+    vm.stack.push('rb')
+
+
+@RegisterBuiltin('w/o', stack_effect='( -- mode )')
+def write_only(vm):
+    vm.stack.push('wb')
+
+
+@RegisterBuiltin('r/w', stack_effect='( -- mode )')
+def read_write(vm):
+    vm.stack.push('r+b')
+
+
+@RegisterBuiltin('open-file', stack_effect='( name mode -- fid )')
+def open_file(vm):
+    """Open a file in binary mode; w/o creates or truncates the file."""
+    name, mode = vm.stack.popn(2)
+    try:
+        vm.stack.push(open(name, mode))
+    except (OSError, TypeError, ValueError) as err:
+        raise VmRuntimeError(f'Cannot open file "{name}": {err}')
+
+
+@RegisterBuiltin('close-file', stack_effect='( fid -- )')
+def close_file(vm):
+    vm.stack.pop().close()
+
+
+@RegisterBuiltin('file-size', stack_effect='( fid -- n )')
+def file_size(vm):
+    fid = vm.stack.pop()
+    try:
+        vm.stack.push(os.fstat(fid.fileno()).st_size)
+    except (OSError, ValueError) as err:
+        raise VmRuntimeError(f'Cannot get the size of "{fid.name}": {err}')
+
+
+@RegisterBuiltin('read-file', stack_effect='( a n fid -- n )')
+def read_file(vm):
+    """Read up to n bytes into memory at a, pushing the number read."""
+    adr, n, fid = vm.stack.popn(3)
+    buffer, offset = vm.memory.locate(adr, n, write=True)
+    try:
+        with memoryview(buffer) as view:
+            vm.stack.push(fid.readinto(view[offset:offset+n]))
+    except (OSError, ValueError, TypeError) as err:
+        raise VmRuntimeError(f'Cannot read from "{fid.name}": {err}')
+
+
+@RegisterBuiltin('write-file', stack_effect='( a n fid -- )')
+def write_file(vm):
+    """Write the n bytes of memory at a."""
+    adr, n, fid = vm.stack.popn(3)
+    buffer, offset = vm.memory.locate(adr, n)
+    try:
+        with memoryview(buffer) as view:
+            fid.write(view[offset:offset+n])
+    except (OSError, ValueError) as err:
+        raise VmRuntimeError(f'Cannot write to "{fid.name}": {err}')
+
+
+@RegisterBuiltin('mmap-file', stack_effect='( fid -- a n )')
+def mmap_file(vm):
+    """
+    Map the contents of an open file into memory, pushing its address and
+    size. Memory words read and write the file in place, without copying;
+    files opened r/o are mapped read-only.
+    """
+    fid = vm.stack.pop()
+    access = mmap.ACCESS_WRITE if fid.writable() else mmap.ACCESS_READ
+    try:
+        buffer = mmap.mmap(fid.fileno(), 0, access=access)
+    except (OSError, ValueError) as err:
+        raise VmRuntimeError(f'Cannot map "{fid.name}": {err}')
+    vm.stack.push(vm.memory.map(buffer))
+    vm.stack.push(len(buffer))
+
+
+@RegisterBuiltin('unmap-file', stack_effect='( a -- )')
+def unmap_file(vm):
+    """Close the mapping at address a, writing back any changes."""
+    vm.memory.unmap(vm.stack.pop()).close()
+
+
 ##############################################################################
 #                       Comments and Documentation
 ##############################################################################
 
 def accum_until(vm, sentinel):
-    length = len(sentinel)
-    stop_buff = deque(sentinel)
-    word_buff = deque([None]) * len(sentinel)
-    accum = deque()
-    while True:
-        try:
-            char = vm.stream.next_char()
-            word_buff.popleft()
-            word_buff.append(char)
-            if word_buff == stop_buff:
-                break
-            else:
-                accum.append(char)
-        except StopIteration:
-            break
-    for _ in range(length-1):
-        accum.pop()
-    return ''.join(accum)
+    return vm.stream.read_until(sentinel)
 
 
 @RegisterBuiltin('\\', immediate=True)
@@ -436,6 +692,7 @@ def paired_comment(vm):
 
 @RegisterBuiltin('("', immediate=True)
 def doc_comment(vm):
+    import textwrap
     text = accum_until(vm, '")')
     pretty = textwrap.indent(textwrap.dedent(text), " "*2)
     if vm.last_word is not None and vm.return_stack:
@@ -448,13 +705,13 @@ def doc_comment(vm):
 def help(vm):
     symb = vm.next_symbol()
     word = vm.dictionary[symb]
-    print(word.stack_effect)
-    print(word.__doc__)
+    vm.output.print(word.stack_effect)
+    vm.output.print(word.__doc__)
 
 
 @RegisterBuiltin()
 def words(vm):
-    print(' '.join(vm.dictionary.keys()))
+    vm.output.print(' '.join(vm.dictionary.keys()))
 
 
 ##############################################################################
@@ -465,7 +722,10 @@ def words(vm):
 def bang(vm):
     adr = vm.stack.pop()
     v = vm.stack.pop()
-    vm.heap[adr] = v
+    if adr in vm.memory:
+        vm.memory.store(adr, v)
+    else:
+        vm.heap[adr] = v
 
 
 @RegisterBuiltin('w!')
@@ -474,6 +734,7 @@ def word_bang(vm):
     v = vm.stack.pop()
     try:
         vm.last_word.code[adr] = v
+        vm.last_word.invalidate()
     except IndexError:
         raise VmRuntimeError(f'Address "{adr}" out of bounds')
 
@@ -482,6 +743,9 @@ def word_bang(vm):
 def plus_bang(vm):
     adr = vm.stack.pop()
     v = vm.stack.pop()
+    if adr in vm.memory:
+        vm.memory.store(adr, vm.memory.fetch(adr) + v)
+        return
     try:
         vm.heap[adr] += v
     except KeyError:
@@ -492,6 +756,9 @@ def plus_bang(vm):
 def minus_bang(vm):
     adr = vm.stack.pop()
     v = vm.stack.pop()
+    if adr in vm.memory:
+        vm.memory.store(adr, vm.memory.fetch(adr) - v)
+        return
     try:
         vm.heap[adr] -= v
     except KeyError:
@@ -501,6 +768,9 @@ def minus_bang(vm):
 @RegisterBuiltin('@')
 def at(vm):
     adr = vm.stack.pop()
+    if adr in vm.memory:
+        vm.stack.push(vm.memory.fetch(adr))
+        return
     try:
         v = vm.heap[adr]
         vm.stack.push(v)
@@ -521,7 +791,104 @@ def word_at(vm):
 @RegisterBuiltin('.m')
 def dotm(vm):
     for k, v in vm.heap.items():
-        print(f'{k} -> {v}')
+        vm.output.print(f'{k} -> {v}')
+
+
+##############################################################################
+#                              Linear Memory
+##############################################################################
+
+@RegisterBuiltin(stack_effect='( -- a )')
+def dp(vm):
+    """
+    Data pointer, the address of the next free byte of linear memory.
+    Forth calls this `here`, which in Sloth is the next address of code.
+    """
+    vm.stack.push(vm.memory.dp)
+
+
+@RegisterBuiltin(stack_effect='( n -- )')
+def allot(vm):
+    """Reserve n bytes of linear memory, or free them if n is negative."""
+    vm.memory.allot(vm.stack.pop())
+
+
+@RegisterBuiltin(stack_effect='( -- )')
+def align(vm):
+    """Align the data pointer to a cell."""
+    vm.memory.align()
+
+
+@RegisterBuiltin(stack_effect='( n -- n )')
+def cells(vm):
+    """Size in bytes of n cells."""
+    ds = vm.stack
+    ds[-1] = ds[-1] * vm.memory.CELL
+
+
+@RegisterBuiltin('cell+', stack_effect='( a -- a )')
+def cell_plus(vm):
+    ds = vm.stack
+    ds[-1] = ds[-1] + vm.memory.CELL
+
+
+@RegisterBuiltin('c@', stack_effect='( a -- b )')
+def c_at(vm):
+    buffer, offset = vm.memory.locate(vm.stack.pop(), 1)
+    vm.stack.push(buffer[offset])
+
+
+@RegisterBuiltin('c!', stack_effect='( b a -- )')
+def c_bang(vm):
+    adr, b = vm.stack.pop(), vm.stack.pop()
+    buffer, offset = vm.memory.locate(adr, 1, write=True)
+    try:
+        buffer[offset] = b
+    except (TypeError, ValueError):
+        raise VmRuntimeError(f'Cannot store "{b}" in a byte at "{adr}"')
+
+
+@RegisterBuiltin(stack_effect='( a n b -- )')
+def fill(vm):
+    """Set n bytes from address a to the byte b."""
+    adr, n, b = vm.stack.popn(3)
+    buffer, offset = vm.memory.locate(adr, n, write=True)
+    try:
+        buffer[offset:offset+n] = bytes((b,)) * n
+    except (TypeError, ValueError):
+        raise VmRuntimeError(f'Cannot fill memory with "{b}"')
+
+
+@RegisterBuiltin(stack_effect='( a n -- )')
+def erase(vm):
+    """Set n bytes from address a to zero."""
+    adr, n = vm.stack.popn(2)
+    buffer, offset = vm.memory.locate(adr, n, write=True)
+    try:
+        buffer[offset:offset+n] = bytes(n)
+    except TypeError:
+        raise VmRuntimeError(f'Cannot write to memory at "{adr}"')
+
+
+@RegisterBuiltin(stack_effect='( src dst n -- )')
+def move(vm):
+    """Copy n bytes from src to dst; the ranges may overlap."""
+    src, dst, n = vm.stack.popn(3)
+    src_buffer, src_offset = vm.memory.locate(src, n)
+    dst_buffer, dst_offset = vm.memory.locate(dst, n, write=True)
+    try:
+        dst_buffer[dst_offset:dst_offset+n] = src_buffer[src_offset:src_offset+n]
+    except TypeError:
+        raise VmRuntimeError(f'Cannot write to memory at "{dst}"')
+
+
+@RegisterBuiltin(stack_effect='( a n b -- i )')
+def scan(vm):
+    """Offset of the first byte b in the n bytes at a, or -1."""
+    adr, n, b = vm.stack.popn(3)
+    buffer, offset = vm.memory.locate(adr, n)
+    i = buffer.find(bytes((b,)), offset, offset + n)
+    vm.stack.push(i if i < 0 else i - offset)
 
 
 ##############################################################################
@@ -590,13 +957,15 @@ def does(vm):
     word = vm.frame_stack.top
     ops = word.code[vm.ip+1:]
     vm.last_word.code.extend(ops)
-    raise WordExit
+    vm.last_word.invalidate()
+    return ret(vm)
 
 
 @RegisterBuiltin(',')
 def comma(vm):
     word = vm.stack.pop()
     vm.last_word.code.append(word)
+    vm.last_word.invalidate()
 
 
 @RegisterBuiltin()
@@ -604,12 +973,26 @@ def lastword(vm):
     vm.stack.push(vm.last_word)
 
 
+def colored(text, color, enabled=True):
+    """
+    Text in a terminal color if `enabled`, or plain text if not, or if
+    termcolor is not installed.
+    """
+    if not enabled:
+        return text
+    try:
+        from termcolor import colored
+    except ImportError:
+        return text
+    return colored(text, color)
+
+
 @RegisterBuiltin()
 def create(vm):
     symb = vm.next_symbol()
     if symb in vm.dictionary and vm.WARN:
-        red_warn = colored('Warning:', 'red')
-        print(red_warn, f'redefining "{symb}" in dictionary')
+        red_warn = colored('Warning:', 'red', vm.COLOR and vm.output.tty)
+        vm.output.print(red_warn, f'redefining "{symb}" in dictionary')
     word = DefinedWord(symb)
     vm.insert_word(word)
 
@@ -626,6 +1009,7 @@ def colon(vm):
 def semicolon(vm):
     vm.exit()
     vm.immediate = True
+    vm.close_definition(vm.last_word)
 
 
 @RegisterBuiltin(immediate=True)
@@ -639,6 +1023,13 @@ def import_module(vm):
     vm.import_module(symb)
 
 
+@RegisterBuiltin('reload', immediate=True)
+def reload_module(vm):
+    """Re-read a module from its source and import its words."""
+    symb = vm.next_symbol()
+    vm.import_module(symb, reload=True)
+
+
 ##############################################################################
 #                          Virtual Machine State
 ##############################################################################
@@ -647,7 +1038,78 @@ def import_module(vm):
 def toggle_warnings(vm):
     vm.WARN = not vm.WARN
     state = 'on' if vm.WARN else 'off'
-    print(f'Warnings turned {state}')
+    vm.output.print(f'Warnings turned {state}')
+
+
+@RegisterBuiltin('toggle-optimizer')
+def toggle_optimizer(vm):
+    """Fuse common sequences of ops when definitions are closed."""
+    vm.OPTIMIZE = not vm.OPTIMIZE
+    state = 'on' if vm.OPTIMIZE else 'off'
+    vm.output.print(f'Optimizer turned {state}')
+
+
+@RegisterBuiltin('toggle-late-binding')
+def toggle_late_binding(vm):
+    """Make redefining a word update the words that use it."""
+    vm.LATE_BIND = not vm.LATE_BIND
+    state = 'on' if vm.LATE_BIND else 'off'
+    vm.output.print(f'Late binding turned {state}')
+
+
+@RegisterBuiltin('.fusions')
+def print_fusions(vm):
+    from .optimizer import fusion_report
+    vm.output.print(fusion_report())
+
+
+@RegisterBuiltin('toggle-jit')
+def toggle_jit(vm):
+    """Compile words to Python once they have been called often enough."""
+    if vm.JIT_THRESHOLD is None:
+        vm.JIT_THRESHOLD = vm.DEFAULT_JIT_THRESHOLD
+    else:
+        vm.JIT_THRESHOLD = None
+    state = 'off' if vm.JIT_THRESHOLD is None else 'on'
+    vm.output.print(f'JIT compilation turned {state}')
+
+
+@RegisterBuiltin()
+def profile(vm):
+    """Toggle counting the calls and time of every word."""
+    if vm.profiler is None or not vm.profiler.enabled:
+        vm.enable_profiler()
+        vm.output.print('Profiling turned on')
+    else:
+        vm.disable_profiler()
+        vm.output.print('Profiling turned off')
+
+
+@RegisterBuiltin('.profile')
+def print_profile(vm):
+    """Print the profile of the words run while profiling was on."""
+    if vm.profiler is None:
+        raise VmRuntimeError('No profile: turn on profiling with "profile".')
+    vm.output.print(vm.profiler.report())
+
+
+@RegisterBuiltin()
+def sample(vm):
+    """Toggle sampling the frame stack with the sampling profiler."""
+    if vm.sampler is None or not vm.sampler.running:
+        vm.start_sampling()
+        vm.output.print('Sampling turned on')
+    else:
+        vm.stop_sampling()
+        vm.output.print('Sampling turned off')
+
+
+@RegisterBuiltin('.samples')
+def print_samples(vm):
+    """Print the samples taken so far as collapsed stacks for flame graphs."""
+    if vm.sampler is None:
+        raise VmRuntimeError('No samples: turn on sampling with "sample".')
+    vm.output.print(vm.sampler.collapsed())
 
 
 ##############################################################################
@@ -656,6 +1118,7 @@ def toggle_warnings(vm):
 
 @RegisterBuiltin()
 def bye(vm):
+    vm.output.flush()
     sys.exit(0)
 
 
@@ -668,6 +1131,10 @@ def pdb(vm):
 @RegisterBuiltin()
 def decompile(vm):
     xt = vm.stack.pop()
-    print(xt.code)
+    vm.output.print(xt.code)
 
 
+# Register the array words, which import NumPy when first used, and the
+# task words
+from . import vector  # noqa: E402
+from . import tasks  # noqa: E402
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Profilers for the words run by a virtual machine.
+
+The deterministic `Profiler` replaces the `execute` and `handle_op` methods
+of a virtual machine with timed versions for as long as it is enabled, so
+the dispatch loop of an unprofiled machine is unchanged. Time spent in a
+defined word is attributed through its frame on the frame stack: from the
+op that pushes the frame until the `ret` that pops it.
+
+The `SamplingProfiler` leaves the machine untouched and periodically
+records its frame stack and instruction pointer instead, from a profiling
+timer signal or from a background thread.
+"""
+
+import json
+import time
+import signal
+import threading
+from collections import Counter
+
+from .errors import index_error
+from .primitives import Word, BuiltinWord, RETURN
+
+
+class WordStats:
+    __slots__ = ('calls', 'self_time', 'cum_time', 'active')
+
+    def __init__(self):
+        self.calls = 0
+        self.self_time = 0.0
+        self.cum_time = 0.0
+        # Number of calls in progress, so that the cumulative time of a
+        # recursive word is only counted for the outermost call.
+        self.active = 0
+
+
+class Profiler:
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.stats = {}
+        # Entries of [word, start time, time in callees] for calls in progress
+        self.calls = []
+        self.enabled = False
+
+    def enable(self, vm):
+        vm.profiler = self
+        vm.execute = self.execute_method(vm)
+        vm.handle_op = self.handle_op_method(vm)
+        self.enabled = True
+
+    def disable(self, vm):
+        """
+        Restore the methods of the machine, keeping the statistics. Words
+        already running, such as the one disabling the profiler, are timed
+        until they return.
+        """
+        del vm.execute
+        del vm.handle_op
+        self.enabled = False
+
+    def reset(self):
+        self.stats.clear()
+
+    def enter(self, word, start):
+        stats = self.stats.get(word)
+        if stats is None:
+            stats = self.stats[word] = WordStats()
+        stats.active += 1
+        self.calls.append([word, start, 0.0])
+
+    def leave(self, end):
+        word, start, callees = self.calls.pop()
+        total = end - start
+        stats = self.stats[word]
+        stats.active -= 1
+        stats.calls += 1
+        stats.self_time += total - callees
+        if not stats.active:
+            stats.cum_time += total
+        if self.calls:
+            self.calls[-1][2] += total
+
+    def unwind(self, n_calls):
+        """Drop the calls left open by an error."""
+        while len(self.calls) > n_calls:
+            word = self.calls.pop()[0]
+            self.stats[word].active -= 1
+
+    def execute_method(self, vm):
+        """Timed version of `VirtualMachine.execute`."""
+        clock = self.clock
+        enter = self.enter
+        leave = self.leave
+
+        def execute(word):
+            frames = vm.frame_stack
+            depth = len(frames)
+            n_calls = len(self.calls)
+            caller = (len(vm.return_stack), vm.ip, vm.code)
+            try:
+                enter(word, clock())
+                word.invoke(vm)
+                if len(frames) <= depth:
+                    leave(clock())
+                else:
+                    while True:
+                        ip = vm.ip + 1
+                        vm.ip = ip
+                        n_frames = len(frames)
+                        code = frames[-1].code
+                        # Literals and the final `ret` are not timed
+                        op = code[ip] if ip < len(code) else None
+                        timed = isinstance(op, Word)
+                        if timed:
+                            enter(op, clock())
+                        returned = vm.code[ip](vm)
+                        if len(frames) > n_frames:
+                            # Entered a defined word, timed until it returns
+                            continue
+                        end = clock()
+                        if timed:
+                            leave(end)
+                        if returned is RETURN:
+                            leave(end)
+                            if len(frames) <= depth:
+                                break
+            except IndexError as err:
+                self.unwind(n_calls)
+                vm.unwind(depth, caller)
+                raise index_error(err) from err
+            except BaseException:
+                self.unwind(n_calls)
+                vm.unwind(depth, caller)
+                raise
+            vm.code = caller[2]
+
+        return execute
+
+    def handle_op_method(self, vm):
+        """Timed version of `VirtualMachine.handle_op`."""
+        clock = self.clock
+
+        def handle_op(word):
+            if isinstance(word, BuiltinWord):
+                n_calls = len(self.calls)
+                self.enter(word, clock())
+                try:
+                    word(vm)
+                except BaseException:
+                    self.unwind(n_calls)
+                    raise
+                self.leave(clock())
+            elif callable(word):
+                word(vm)
+            else:
+                vm.stack.push(word)
+
+        return handle_op
+
+    def rows(self, sort='self_time'):
+        rows = [
+            {
+                'word': word.symbol,
+                'kind': 'builtin' if isinstance(word, BuiltinWord) else 'defined',
+                'calls': stats.calls,
+                'self_time': stats.self_time,
+                'cum_time': stats.cum_time,
+            }
+            for word, stats in self.stats.items() if stats.calls
+        ]
+        rows.sort(key=lambda row: row[sort], reverse=True)
+        return rows
+
+    def report(self, sort='self_time', limit=None):
+        """Format the statistics as a table, sorted by descending `sort`."""
+        rows = self.rows(sort)[:limit]
+        lines = [f'{"calls":>10} {"self (s)":>10} {"cum (s)":>10}  word']
+        for row in rows:
+            lines.append(f'{row["calls"]:>10} {row["self_time"]:>10.6f} '
+                         f'{row["cum_time"]:>10.6f}  {row["word"]}')
+        return '\n'.join(lines)
+
+    def to_json(self, sort='self_time', **kwargs):
+        return json.dumps(self.rows(sort), **kwargs)
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler sampling the frame stack of a virtual machine every
+    `interval` seconds. Samples are keyed by the symbols of the words on the
+    frame stack, with the innermost word suffixed by its code offset, e.g.
+    `main;fib;fib+7`, and can be written in the collapsed stack format read
+    by flame graph tools.
+
+    With `mode='signal'` samples are taken by a `SIGPROF` handler, driven by
+    the CPU time of the process; this is only possible from the main thread
+    of a Unix process. With `mode='thread'` a background thread samples at
+    wall clock intervals. The default picks the signal when it can.
+    """
+    def __init__(self, vm, interval=0.005, mode=None):
+        self.vm = vm
+        self.interval = interval
+        if mode is None:
+            in_main = threading.current_thread() is threading.main_thread()
+            mode = 'signal' if in_main and hasattr(signal, 'setitimer') else 'thread'
+        self.mode = mode
+        self.samples = Counter()
+        self.running = False
+        self.thread = None
+        self.old_handler = None
+
+    def sample(self, *args):
+        vm = self.vm
+        frames = list(vm.frame_stack)
+        if not frames:
+            self.samples['<interpret>',] += 1
+            return
+        key = [word.symbol for word in frames]
+        # Right after `invoke` the offset is -1, until the inner interpreter
+        # moves on to the first op
+        key[-1] = f'{key[-1]}+{max(vm.ip, 0)}'
+        self.samples[tuple(key)] += 1
+
+    def run_thread(self):
+        while self.running:
+            time.sleep(self.interval)
+            self.sample()
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        if self.mode == 'signal':
+            self.old_handler = signal.signal(signal.SIGPROF, self.sample)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        else:
+            self.thread = threading.Thread(target=self.run_thread, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        if self.mode == 'signal':
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            signal.signal(signal.SIGPROF, self.old_handler)
+        else:
+            self.thread.join()
+            self.thread = None
+
+    def collapsed(self):
+        """The samples in collapsed stack format, one stack per line."""
+        return '\n'.join(
+            f'{";".join(key)} {count}'
+            for key, count in sorted(self.samples.items())
+        )
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            f.write(self.collapsed())
+            f.write('\n')
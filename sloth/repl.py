@@ -1,18 +1,20 @@
 #!/usr/bin/env python3
 
 import os
+import bisect
 import pathlib
+import reprlib
 
-from termcolor import colored
 from prompt_toolkit import prompt
 from prompt_toolkit.keys import Keys
-from prompt_toolkit.contrib.completers import WordCompleter
+from prompt_toolkit.completion import Completer, Completion
 from prompt_toolkit.history import FileHistory, InMemoryHistory
 from prompt_toolkit.key_binding.manager import KeyBindingManager
 from pygments.token import Token
 
 from .core import VirtualMachine
 from .errors import VmRuntimeError
+from .primitives import is_array, colored
 from .styling import SlothStyle, SlothLexer
 
 
@@ -23,18 +25,65 @@ except:
     HISTORY = InMemoryHistory()
 
 
-def get_completer(vm):
-    matchables = set(k for k in vm.dictionary if isinstance(k, str))
-    completer = WordCompleter(matchables)
-    return completer
+# Number of stack items shown in the toolbar, and the width each may take
+TOOLBAR_ITEMS = 8
+TOOLBAR_ITEM_WIDTH = 24
+
+SHORT_REPR = reprlib.Repr()
+SHORT_REPR.maxstring = SHORT_REPR.maxother = TOOLBAR_ITEM_WIDTH
+SHORT_REPR.maxlist = SHORT_REPR.maxtuple = 4
+
+
+class DictionaryCompleter(Completer):
+    """
+    Complete the word before the cursor from the words of a dictionary.
+    The words are kept in a sorted list, updated as words are defined or
+    reverted, so completing a prefix is a binary search.
+    """
+    def __init__(self, dictionary):
+        self.words = sorted(k for k in dictionary if isinstance(k, str))
+        dictionary.observers.append(self.update)
+
+    def update(self, key, added):
+        if not isinstance(key, str):
+            return
+        i = bisect.bisect_left(self.words, key)
+        found = i < len(self.words) and self.words[i] == key
+        if added and not found:
+            self.words.insert(i, key)
+        elif not added and found:
+            del self.words[i]
+
+    def get_completions(self, document, complete_event):
+        prefix = document.get_word_before_cursor(WORD=True)
+        i = bisect.bisect_left(self.words, prefix)
+        for word in self.words[i:]:
+            if not word.startswith(prefix):
+                break
+            yield Completion(word, -len(prefix))
+
+
+def format_item(x):
+    """Short text for a stack item, without formatting all of a large value."""
+    if isinstance(x, int) and x.bit_length() > 64:
+        return f'<{x.bit_length()} bit int>'
+    if is_array(x):
+        if x.size > 4:
+            return f'<{x.dtype} array {"x".join(map(str, x.shape))}>'
+        text = str(x)
+    elif isinstance(x, str):
+        text = x if len(x) <= TOOLBAR_ITEM_WIDTH else x[:TOOLBAR_ITEM_WIDTH-3] + '...'
+    else:
+        text = SHORT_REPR.repr(x)
+    return ' '.join(text.split())
 
 
 def get_toolbar(vm):
-    stack_items = (str(x) for x in vm.stack)
-    line = ' '.join(stack_items).replace('\n','').replace('\t','')
-    if len(line) > 73:
+    items = [format_item(x) for x in vm.stack[-TOOLBAR_ITEMS:]]
+    line = ' '.join(items)
+    if len(vm.stack) > TOOLBAR_ITEMS or len(line) > 73:
         line = '... {0}'.format(line[-63:])
-    top_txt = ' [top]' if stack_items else ''
+    top_txt = ' [top]' if vm.stack else ''
     msg = f'stack: {line}{top_txt}'
     def get_tokens(cli):
         return [(Token.Toolbar, msg)]
@@ -88,8 +137,7 @@ def get_bindings():
     return key_bindings_manager
 
 
-def sloth_prompt(vm):
-    completer = get_completer(vm)
+def sloth_prompt(vm, completer):
     toolbar = get_toolbar(vm)
     key_bindings_manager = get_bindings()
     source = prompt('sloth> ', #' « ',
@@ -114,10 +162,12 @@ def repl():
     print('Hit CTRL+D or type "bye" to quit.')
     red_err = colored('Error:', 'red')
     vm = VirtualMachine('')
+    vm.COLOR = True
     vm.import_module('std')
+    completer = DictionaryCompleter(vm.dictionary)
     while True:
         try:
-            source = sloth_prompt(vm)
+            source = sloth_prompt(vm, completer)
             vm.read_input(source)
             vm.run()
         except (VmRuntimeError, RuntimeError, KeyError, IndexError) as e:
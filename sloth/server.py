@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Serve many concurrent Sloth sessions over a TCP or Unix socket from one
+asyncio event loop.
+
+Each connection gets its own virtual machine, layered over a single shared
+read-only dictionary holding the primitives and the words of the imported
+modules, so that a session only holds its own definitions. A request is a
+line of source text, and its response is the output of the request followed
+by a status line: `ok` and the data stack, or `error` and the message, in
+which case the session is reverted to its state before the request.
+
+Requests run in slices of instructions, yielding to the event loop between
+slices so that a busy session cannot starve the others, and fail once they
+exceed their instruction budget. Builtins are never interrupted, so a single
+long running builtin still holds up the loop. Sessions cannot run the words
+reaching outside their machine, such as the file words and `bye`.
+
+    python -m sloth.server --port 7070
+    python -m sloth.server --unix /tmp/sloth.sock
+"""
+
+import sys
+import asyncio
+import argparse
+from io import StringIO
+from types import MappingProxyType
+
+from .core import VirtualMachine, Output
+
+
+# Words left out of the dictionary of sessions: those reaching the files,
+# terminal or process of the server, importing modules from its file system,
+# or running code that the instruction budget does not count
+RESTRICTED = frozenset([
+    'bye', 'pdb', 'key', 'import', 'reload',
+    'r/o', 'w/o', 'r/w', 'open-file', 'close-file', 'file-size', 'read-file',
+    'write-file', 'mmap-file', 'unmap-file',
+    'profile', '.profile', 'sample', '.samples', 'toggle-jit',
+])
+
+
+def base_dictionary(modules=('std',), exclude=RESTRICTED):
+    """
+    The shared read-only dictionary of the primitives and the words of the
+    modules, without the `exclude` words, and the read-only imports of those
+    modules.
+    """
+    vm = VirtualMachine('')
+    for modname in modules:
+        vm.import_module(modname)
+    words = {k: w for k, w in vm.dictionary.items() if k not in exclude}
+    return MappingProxyType(words), MappingProxyType(vm.imports)
+
+
+class Session:
+    """A virtual machine for one connection, with its output captured."""
+    def __init__(self, base, imports):
+        self.vm = VirtualMachine('', base=base)
+        self.vm.imports.update(imports)
+        self.capture = StringIO()
+        self.vm.output = Output(self.capture)
+
+    def take_output(self):
+        self.vm.output.flush()
+        text = self.capture.getvalue()
+        self.capture.seek(0)
+        self.capture.truncate()
+        return text
+
+
+class Server:
+    # Instructions run before yielding to other sessions, and at most per
+    # request
+    SLICE_OPS = 10000
+    BUDGET = 10**7
+
+    def __init__(self, modules=('std',), slice_ops=None, budget=None,
+                 exclude=RESTRICTED):
+        self.base, self.imports = base_dictionary(modules, exclude)
+        self.slice_ops = self.SLICE_OPS if slice_ops is None else slice_ops
+        self.budget = self.BUDGET if budget is None else budget
+        self.sessions = set()
+
+    async def run_request(self, session, source):
+        """Run a request, returning its output and status line."""
+        vm = session.vm
+        vm.read_input(source)
+        try:
+            while not vm.run_sliced(self.slice_ops, limit=self.budget):
+                await asyncio.sleep(0)
+        except SystemExit:
+            raise
+        except Exception as err:
+            vm.revert()
+            message = ' '.join(str(err).split())
+            status = f'error {type(err).__name__}: {message}'
+        else:
+            status = ' '.join(['ok'] + [str(x) for x in vm.stack])
+        output = session.take_output()
+        if output and not output.endswith('\n'):
+            output += '\n'
+        return output, status
+
+    async def handle(self, reader, writer):
+        session = Session(self.base, self.imports)
+        self.sessions.add(session)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                output, status = await self.run_request(
+                    session, line.decode(errors='replace'))
+                writer.write(f'{output}{status}\n'.encode())
+                await writer.drain()
+        except SystemExit:
+            # The session ran `bye`, if not excluded
+            writer.write(session.take_output().encode())
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions.discard(session)
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=7070, path=None):
+        """Start listening on a TCP port, or on a Unix socket at `path`."""
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle, path)
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def serve_forever(self, host='127.0.0.1', port=7070, path=None):
+        server = await self.start(host, port, path)
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Serve Sloth sessions over a TCP or Unix socket.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7070)
+    parser.add_argument('--unix', metavar='PATH',
+                        help='listen on a Unix socket instead of TCP')
+    parser.add_argument('--slice', type=int, default=None, dest='slice_ops',
+                        help='instructions run before yielding to other '
+                             'sessions')
+    parser.add_argument('--budget', type=int, default=None,
+                        help='instructions allowed per request')
+    parser.add_argument('--no-std', action='store_true',
+                        help='do not import the standard library')
+    args = parser.parse_args(argv)
+    modules = () if args.no_std else ('std',)
+    server = Server(modules, slice_ops=args.slice_ops, budget=args.budget)
+    try:
+        asyncio.run(server.serve_forever(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Cooperative tasks interleaved on a single virtual machine.
+
+A task has its own data, return and frame stacks, instruction pointer and
+code, which the scheduler swaps into the registers of the machine to run
+it. As the inner interpreter keeps the frames of defined words on the frame
+stack rather than in Python calls, a task can be suspended between any two
+ops and resumed later. Tasks switch when they `yield`, block on a channel or
+a `join`, or have run for a quantum of ops.
+
+Tasks only run while the main program waits on them, in `yield`, `join`,
+`send` or `recv`. These words, when they cannot switch, such as in the main
+program or inside a word called from a builtin, instead run the other tasks
+until they can continue.
+"""
+
+from collections import deque
+
+from .errors import VmRuntimeError, index_error
+from .primitives import RegisterBuiltin, DefinedWord, RETURN
+
+
+# Returned by the task words when they suspend the current task
+SWITCH = object()
+
+
+class Task:
+    __slots__ = ('stack', 'return_stack', 'frame_stack', 'ip', 'code', 'xt',
+                 'started', 'done', 'blocked', 'joiners')
+
+    def __init__(self, vm, xt, args):
+        self.stack = type(vm.stack)(args, limit=vm.STACK_LIMIT)
+        self.return_stack = type(vm.return_stack)(limit=vm.STACK_LIMIT)
+        self.frame_stack = type(vm.frame_stack)()
+        self.ip = 0
+        self.code = None
+        self.xt = xt
+        self.started = False
+        self.done = False
+        self.blocked = False
+        # Tasks waiting in `join` for this one to finish
+        self.joiners = deque()
+
+    def __repr__(self):
+        state = 'done' if self.done else 'blocked' if self.blocked else 'ready'
+        return f'<task {self.xt.symbol} {state}>'
+
+
+class Channel:
+    """A queue of at most `capacity` items between tasks."""
+    __slots__ = ('items', 'capacity', 'senders', 'receivers')
+
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise VmRuntimeError('Channel capacity must be at least 1')
+        self.items = deque()
+        self.capacity = capacity
+        self.senders = deque()
+        self.receivers = deque()
+
+    def __repr__(self):
+        return f'<channel {len(self.items)}/{self.capacity}>'
+
+
+def save_registers(vm):
+    return (vm.stack, vm.return_stack, vm.frame_stack, vm.ip, vm.code)
+
+
+def load_registers(vm, registers):
+    vm.stack, vm.return_stack, vm.frame_stack, vm.ip, vm.code = registers
+
+
+class Scheduler:
+    # Ops a task runs before switching to the next ready task
+    QUANTUM = 1000
+
+    def __init__(self, vm):
+        self.vm = vm
+        self.ready = deque()
+        # The task run by `run_task`, and the depth of words called from
+        # builtins within it, where it cannot be suspended
+        self.current = None
+        self.nesting = 0
+
+    def spawn(self, xt, args):
+        task = Task(self.vm, xt, args)
+        self.ready.append(task)
+        return task
+
+    def can_switch(self):
+        return self.current is not None and not self.nesting
+
+    def wake(self, waiters):
+        while waiters:
+            task = waiters.popleft()
+            task.blocked = False
+            self.ready.append(task)
+
+    def block(self, waiters):
+        """
+        Suspend the current task until woken from `waiters`, to run the
+        word blocking it again.
+        """
+        vm = self.vm
+        task = self.current
+        task.blocked = True
+        waiters.append(task)
+        vm.ip -= 1
+
+    def wait(self, waiters, condition):
+        """
+        Wait in a blocking word until `condition` holds. Returns True if it
+        holds, or False if the current task was suspended instead.
+        """
+        if condition():
+            return True
+        if self.can_switch():
+            self.block(waiters)
+            return False
+        self.run_until(condition)
+        return True
+
+    def run_until(self, condition, turns=None):
+        """
+        Run the ready tasks from a context that cannot switch, until
+        `condition` holds or, if given, a number of `turns` have been run.
+        """
+        vm = self.vm
+        registers = save_registers(vm)
+        current, nesting = self.current, self.nesting
+        try:
+            while not condition():
+                if turns is not None:
+                    if not turns or not self.ready:
+                        break
+                    turns -= 1
+                elif not self.ready:
+                    raise VmRuntimeError('Deadlock: no task is ready to run')
+                self.run_task(self.ready.popleft())
+        finally:
+            load_registers(vm, registers)
+            self.current, self.nesting = current, nesting
+
+    def run_round(self):
+        """Give each task ready now one turn."""
+        self.run_until(lambda: False, turns=len(self.ready))
+
+    def nested_execute(self, execute):
+        def nested(word):
+            self.nesting += 1
+            try:
+                execute(word)
+            finally:
+                self.nesting -= 1
+        return nested
+
+    def run_task(self, task):
+        """Run a task until it finishes, blocks, yields or uses its quantum."""
+        vm = self.vm
+        load_registers(vm, (task.stack, task.return_stack, task.frame_stack,
+                            task.ip, task.code))
+        self.current = task
+        self.nesting = 0
+        saved_execute = vm.__dict__.get('execute')
+        vm.execute = self.nested_execute(saved_execute or vm.execute)
+        frames = vm.frame_stack
+        try:
+            if not task.started:
+                task.started = True
+                if isinstance(task.xt, DefinedWord):
+                    task.xt.invoke(vm)
+                else:
+                    # A builtin runs to completion, without a frame to
+                    # suspend
+                    self.nesting = 1
+                    task.xt(vm)
+                    self.nesting = 0
+            quantum = n = self.QUANTUM if frames else 0
+            while n:
+                n -= 1
+                ip = vm.ip + 1
+                vm.ip = ip
+                action = vm.code[ip](vm)
+                if action is SWITCH or action is RETURN and not frames:
+                    break
+            vm.count_ops(quantum - n)
+        except IndexError as err:
+            task.done = True
+            raise index_error(err) from err
+        except BaseException:
+            task.done = True
+            raise
+        finally:
+            if saved_execute is None:
+                del vm.execute
+            else:
+                vm.execute = saved_execute
+            task.ip, task.code = vm.ip, vm.code
+        if not frames:
+            task.done = True
+            self.wake(task.joiners)
+        elif not task.blocked:
+            self.ready.append(task)
+
+
+def get_scheduler(vm):
+    if vm.scheduler is None:
+        vm.scheduler = Scheduler(vm)
+    return vm.scheduler
+
+
+##############################################################################
+#                                  Words
+##############################################################################
+
+@RegisterBuiltin(stack_effect='( x1 .. xn n xt -- task )')
+def spawn(vm):
+    """Start a task running xt on a stack of the n items below it."""
+    n, xt = vm.stack.popn(2)
+    args = vm.stack.popn(n)
+    vm.stack.push(get_scheduler(vm).spawn(xt, args))
+
+
+@RegisterBuiltin('yield', stack_effect='( -- )')
+def yield_(vm):
+    """Switch to the next ready task."""
+    scheduler = get_scheduler(vm)
+    if scheduler.can_switch():
+        return SWITCH
+    scheduler.run_round()
+
+
+@RegisterBuiltin(stack_effect='( task -- x1 .. xn )')
+def join(vm):
+    """Wait for a task to finish and push the items left on its stack."""
+    task = vm.stack[-1]
+    if not get_scheduler(vm).wait(task.joiners, lambda: task.done):
+        return SWITCH
+    vm.stack.pop()
+    vm.stack.pushn(task.stack)
+
+
+@RegisterBuiltin(stack_effect='( n -- ch )')
+def channel(vm):
+    """Channel holding up to n items."""
+    vm.stack.push(Channel(vm.stack.pop()))
+
+
+@RegisterBuiltin(stack_effect='( x ch -- )')
+def send(vm):
+    """Put an item on a channel, waiting while it is full."""
+    ch = vm.stack[-1]
+    if len(ch.items) >= ch.capacity and not get_scheduler(vm).wait(
+            ch.senders, lambda: len(ch.items) < ch.capacity):
+        return SWITCH
+    ch, x = vm.stack.pop(), vm.stack.pop()
+    ch.items.append(x)
+    if ch.receivers:
+        vm.scheduler.wake(ch.receivers)
+
+
+@RegisterBuiltin(stack_effect='( ch -- x )')
+def recv(vm):
+    """Take the oldest item from a channel, waiting while it is empty."""
+    ch = vm.stack[-1]
+    if not ch.items and not get_scheduler(vm).wait(
+            ch.receivers, lambda: ch.items):
+        return SWITCH
+    vm.stack[-1] = ch.items.popleft()
+    if ch.senders:
+        vm.scheduler.wake(ch.senders)
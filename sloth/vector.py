@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Words creating and operating on NumPy arrays. NumPy is an optional
+dependency, imported the first time one of these words runs.
+
+The arithmetic and comparison words apply elementwise to arrays through the
+Python operators, and the logical words through `is_array`, so a single word
+can process a whole array in one dispatch.
+"""
+
+from .errors import VmRuntimeError
+from .primitives import RegisterBuiltin
+
+
+def numpy():
+    try:
+        import numpy as np
+    except ImportError:
+        raise VmRuntimeError('Array words require NumPy to be installed')
+    return np
+
+
+def pop_shape(vm):
+    """Pop a shape given as an integer count of dimensions above it."""
+    n = vm.stack.pop()
+    return tuple(vm.stack.popn(n))
+
+
+##############################################################################
+#                              Construction
+##############################################################################
+
+@RegisterBuiltin(stack_effect='( n -- a )')
+def iota(vm):
+    """Array of the integers from 0 up to n."""
+    np = numpy()
+    vm.stack.push(np.arange(vm.stack.pop()))
+
+
+@RegisterBuiltin(stack_effect='( start stop step -- a )')
+def arange(vm):
+    """Array of evenly spaced values from start up to stop."""
+    np = numpy()
+    start, stop, step = vm.stack.popn(3)
+    vm.stack.push(np.arange(start, stop, step))
+
+
+@RegisterBuiltin(stack_effect='( start stop n -- a )')
+def linspace(vm):
+    """Array of n evenly spaced values from start to stop inclusive."""
+    np = numpy()
+    start, stop, n = vm.stack.popn(3)
+    vm.stack.push(np.linspace(start, stop, n))
+
+
+@RegisterBuiltin(stack_effect='( n -- a )')
+def zeros(vm):
+    np = numpy()
+    vm.stack.push(np.zeros(vm.stack.pop()))
+
+
+@RegisterBuiltin(stack_effect='( n -- a )')
+def ones(vm):
+    np = numpy()
+    vm.stack.push(np.ones(vm.stack.pop()))
+
+
+@RegisterBuiltin('>array', stack_effect='( x1 .. xn n -- a )')
+def to_array(vm):
+    """Collect the top n items into an array."""
+    np = numpy()
+    vm.stack.push(np.array(vm.stack.popn(vm.stack.pop())))
+
+
+@RegisterBuiltin('array>', stack_effect='( a -- x1 .. xn )')
+def from_array(vm):
+    """Push the items of a one dimensional array."""
+    vm.stack.pushn(vm.stack.pop().tolist())
+
+
+##############################################################################
+#                             Shape and Indexing
+##############################################################################
+
+@RegisterBuiltin(stack_effect='( a -- n )')
+def size(vm):
+    """Number of elements of an array."""
+    vm.stack.unary_op(lambda a: a.size)
+
+
+@RegisterBuiltin(stack_effect='( a -- n1 .. nk k )')
+def shape(vm):
+    """Push the dimensions of an array followed by their count."""
+    dims = vm.stack.pop().shape
+    vm.stack.pushn(dims)
+    vm.stack.push(len(dims))
+
+
+@RegisterBuiltin(stack_effect='( a n1 .. nk k -- a )')
+def reshape(vm):
+    dims = pop_shape(vm)
+    vm.stack.unary_op(lambda a: a.reshape(dims))
+
+
+@RegisterBuiltin(stack_effect='( a -- a )')
+def flatten(vm):
+    vm.stack.unary_op(lambda a: a.ravel())
+
+
+@RegisterBuiltin(stack_effect='( a -- a )')
+def transpose(vm):
+    vm.stack.unary_op(lambda a: a.T)
+
+
+@RegisterBuiltin('a@', stack_effect='( a i -- x )')
+def array_fetch(vm):
+    """Element or sub-array at index i, which may be an index array."""
+    vm.stack.binary_op(lambda a, i: a[i])
+
+
+@RegisterBuiltin('a!', stack_effect='( x a i -- )')
+def array_store(vm):
+    value, a, i = vm.stack.popn(3)
+    a[i] = value
+
+
+@RegisterBuiltin('slice', stack_effect='( a start stop -- a )')
+def array_slice(vm):
+    """View of the elements from start up to stop."""
+    start, stop = vm.stack.popn(2)
+    vm.stack.unary_op(lambda a: a[start:stop])
+
+
+@RegisterBuiltin(stack_effect='( c a b -- a )')
+def where(vm):
+    """Elements of a where the flags of c are true, otherwise of b."""
+    np = numpy()
+    cond, a, b = vm.stack.popn(3)
+    vm.stack.push(np.where(cond, a, b))
+
+
+@RegisterBuiltin(stack_effect='( a c -- a )')
+def select(vm):
+    """Elements of a where the flags of c are true."""
+    vm.stack.binary_op(lambda a, c: a[c])
+
+
+@RegisterBuiltin(stack_effect='( a b -- a )')
+def concat(vm):
+    np = numpy()
+    vm.stack.binary_op(lambda a, b: np.concatenate((a, b)))
+
+
+##############################################################################
+#                          Elementwise and Reduction
+##############################################################################
+
+def register_numpy(symbol, name, doc, stack_effect):
+    """Register a word applying the NumPy function `name` to the top item."""
+    def word(vm):
+        vm.stack.unary_op(getattr(numpy(), name))
+    word.__name__ = name
+    word.__doc__ = doc.format(name=name)
+    RegisterBuiltin(symbol, stack_effect=stack_effect)(word)
+
+
+for _name in ('sqrt', 'exp', 'log', 'sin', 'cos', 'tan', 'floor', 'ceil',
+              'cumsum', 'sort'):
+    register_numpy(_name, _name, 'Elementwise `numpy.{name}`.', '( a -- a )')
+
+# `count-nonzero` rather than `count`, which Forth uses for counted strings
+for _symbol, _name in (('sum', 'sum'), ('prod', 'prod'), ('mean', 'mean'),
+                       ('amax', 'max'), ('amin', 'min'), ('argmax', 'argmax'),
+                       ('argmin', 'argmin'), ('any', 'any'), ('all', 'all'),
+                       ('count-nonzero', 'count_nonzero')):
+    register_numpy(_symbol, _name, 'Reduce an array with `numpy.{name}`.',
+                   '( a -- x )')
+
+
+@RegisterBuiltin(stack_effect='( a b -- x )')
+def dot(vm):
+    """Dot product of two vectors, or matrix product."""
+    np = numpy()
+    vm.stack.binary_op(np.dot)
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+
+import pytest
+
+from sloth.core import VirtualMachine
+
+
+@pytest.fixture
+def vm():
+    vm = VirtualMachine('')
+    vm.import_module('std')
+    vm.read_input(': f 2 + ; : sq dup * ;')
+    vm.run()
+    return vm
+
+
+@pytest.mark.parametrize('word, inputs', [
+    ('f', [5, 1.5]),
+    ('f', [1, 2, 3]),
+    ('f', [1.0, 2.5]),
+    ('sq', [(3,), (0.5,)]),
+])
+def test_map_word_matches_per_item_loop(vm, word, inputs):
+    pytest.importorskip('numpy')
+    vectorized = vm.map_word(word, inputs)
+    looped = vm.map_word(word, inputs, vectorize=False)
+    assert vectorized == looped
+    assert [type(x) for row in vectorized for x in row] == \
+           [type(x) for row in looped for x in row]
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Differential tests running the same programs with the JIT off and on.
+"""
+
+import pytest
+
+from sloth.core import VirtualMachine
+
+
+def new_vm(jit):
+    vm = VirtualMachine('')
+    vm.import_module('std')
+    # Compile words on their first call
+    vm.JIT_THRESHOLD = 1 if jit else None
+    return vm
+
+
+def run_lines(vm, lines):
+    """Run lines as the REPL does, reverting those that fail."""
+    for line in lines:
+        vm.read_input(line)
+        try:
+            vm.run()
+        except Exception:
+            vm.revert()
+    return list(vm.stack)
+
+
+def both(lines):
+    return [run_lines(new_vm(jit), lines) for jit in (False, True)]
+
+
+@pytest.mark.parametrize('lines', [
+    # Fused comparison branches in code copied by `does>`
+    [': mk create , does> 2 over < if 100 + then ;', '5 mk x', 'x x'],
+    # Optimized code restored by rolling back a failed line
+    [': clip dup 10 swap < if drop 10 then ;', 'undefined-word',
+     '25 clip 5 clip'],
+    [': clip dup 10 swap < if drop 10 then ;', ': bad 1 undefined-word',
+     '25 clip 5 clip'],
+])
+def test_jit_matches_interpreter(lines):
+    interpreted, compiled = both(lines)
+    assert compiled == interpreted
+
+
+@pytest.mark.parametrize('lines, expected', [
+    ([': down 0> if 1- down then ;', '100000 down'], [0]),
+    # A compiled word calling a recursive one
+    ([': down 0> if 1- down then ;', ': start down 1+ ;', '100000 start'],
+     [1]),
+])
+def test_deep_recursion_with_jit(lines, expected):
+    vm = new_vm(jit=True)
+    for line in lines:
+        vm.read_input(line)
+        vm.run()
+    assert list(vm.stack) == expected
+
+
+@pytest.mark.parametrize('optimize', [True, False])
+@pytest.mark.parametrize('jit', [False, True])
+def test_array_constant_in_definition(optimize, jit):
+    pytest.importorskip('numpy')
+    vm = new_vm(jit)
+    vm.OPTIMIZE = optimize
+    vm.read_input('5 iota constant arr : g arr 2 * arr + sum ; g g')
+    vm.run()
+    assert list(vm.stack) == [30, 30]
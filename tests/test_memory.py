@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+
+import pytest
+
+from sloth.core import VirtualMachine, Memory
+from sloth.errors import VmRuntimeError
+
+
+def run(source):
+    vm = VirtualMachine(source)
+    vm.import_module('std')
+    vm.run()
+    return list(vm.stack)
+
+
+@pytest.mark.parametrize('source', [
+    'dp 4 allot 7 swap !',
+    'dp 4 allot @',
+    'dp 12 allot 8 + @',
+])
+def test_cell_past_allotted_space(source):
+    with pytest.raises(VmRuntimeError):
+        run(source)
+
+
+def test_cell_in_allotted_space():
+    assert run('dp 16 allot 8 + dup 7 swap ! @') == [7]
+
+
+def test_cell_past_mapping():
+    memory = Memory()
+    adr = memory.map(bytearray(12))
+    memory.store(adr, 5)
+    assert memory.fetch(adr) == 5
+    with pytest.raises(VmRuntimeError):
+        memory.fetch(adr + 8)